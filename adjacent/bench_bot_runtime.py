@@ -0,0 +1,131 @@
+"""Load benchmark: threaded dispatcher (bot.py) vs the AsyncTeleBot runtime (async_bot.py).
+
+Both runtimes are fed the same fake Telegram updates and route them to a stand-in agent
+that waits AGENT_LATENCY seconds, as a real agent waits on OpenAI or Todoist. Telegram
+sends are replaced by counters, so nothing leaves the machine. Run from the repository
+root (it reads config.toml like the bots do):
+
+    python adjacent/bench_bot_runtime.py [chats] [messages_per_chat] [latency_seconds] [threads]
+
+The threaded dispatcher's workers and the async runtime's executor both get `threads`
+threads, so the executor-bridged numbers compare runtimes rather than pool sizes. The
+threaded runtime drops superseded text messages, so keep messages_per_chat at 1 for an
+even comparison.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telebot import types
+
+import async_bot
+import bot as threaded_bot
+from agents import Agent
+from dispatcher import ChatDispatcher
+
+CHATS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+PER_CHAT = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+AGENT_LATENCY = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+THREADS = int(sys.argv[4]) if len(sys.argv) > 4 else 64
+
+
+class SleepAgent(Agent):
+    def __init__(self, done):
+        super().__init__("Bench")
+        self.done = done
+
+    def handle(self, bot, message):
+        time.sleep(AGENT_LATENCY)
+        bot.send_message(message.chat.id, "done")
+        self.done()
+
+
+class AsyncSleepAgent(SleepAgent):
+    async def handle_async(self, bot, message):
+        await asyncio.sleep(AGENT_LATENCY)
+        await bot.send_message(message.chat.id, "done")
+        self.done()
+
+
+def make_updates():
+    """One /use_tasks command per chat, then PER_CHAT text messages per chat, interleaved."""
+    raw = [(chat, "/use_tasks") for chat in range(CHATS)]
+    raw += [(chat, f"question {i}") for i in range(PER_CHAT) for chat in range(CHATS)]
+    return [
+        types.Update.de_json({
+            "update_id": n,
+            "message": {
+                "message_id": n,
+                "date": 0,
+                "chat": {"id": chat, "type": "private"},
+                "from": {"id": chat, "is_bot": False, "first_name": "bench"},
+                "text": text,
+            },
+        })
+        for n, (chat, text) in enumerate(raw, start=1)
+    ]
+
+
+class Counter:
+    def __init__(self, target):
+        self.count = 0
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.target = target
+
+    def __call__(self):
+        with self.lock:
+            self.count += 1
+            if self.count >= self.target:
+                self.finished.set()
+
+
+def bench_threaded():
+    counter = Counter(CHATS * PER_CHAT)
+    bot = threaded_bot.bot
+    bot.send_message = lambda *a, **k: None
+    bot.reply_to = lambda *a, **k: None
+    threaded_bot.bot_agents["use_tasks"] = SleepAgent(counter)
+    threaded_bot.dispatcher = ChatDispatcher(
+        max_workers=THREADS,
+        max_pending=CHATS * PER_CHAT,
+    )
+    updates = make_updates()
+    start = time.perf_counter()
+    bot.process_new_updates(updates)
+    counter.finished.wait()
+    return time.perf_counter() - start
+
+
+async def bench_async(agent_cls):
+    counter = Counter(CHATS * PER_CHAT)
+
+    async def noop(*args, **kwargs):
+        return None
+
+    asyncio.get_running_loop().set_default_executor(
+        async_bot.ThreadPoolExecutor(max_workers=THREADS)
+    )
+    bot = async_bot.create_bot("0:bench", agents={"use_tasks": agent_cls(counter)})
+    bot.send_message = noop
+    bot.reply_to = noop
+    updates = make_updates()
+    start = time.perf_counter()
+    await bot.process_new_updates(updates)
+    return time.perf_counter() - start
+
+
+def report(name, seconds):
+    total = CHATS * PER_CHAT
+    print(f"{name:<34} {total:>6} msgs {seconds:>8.2f}s {total / seconds:>9.1f} msg/s")
+
+
+if __name__ == "__main__":
+    print(f"{CHATS} chats x {PER_CHAT} message(s), agent latency {AGENT_LATENCY}s, {THREADS} threads per runtime")
+    report("threaded dispatcher (bot.py)", bench_threaded())
+    report("async, executor-bridged agent", asyncio.run(bench_async(SleepAgent)))
+    report("async, async-native agent", asyncio.run(bench_async(AsyncSleepAgent)))
@@ -1,14 +1,25 @@
 import json
+import os
+import sys
 import toml
 from openai import OpenAI
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from embedding_cache import EmbeddingCache, cached_embeddings
+
 # ---- Config ----
 CONFIG = toml.load("../config.toml")
 OPENAI_API_KEY = CONFIG["openai"]["api"]
 EMBEDDING_MODEL = "text-embedding-3-large"
 FILE_PATH = "../examples.jsonl"
+CACHE_PATH = "../cache/embeddings.sqlite3"
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+cache = EmbeddingCache(CACHE_PATH)
+
+def embed_fn(texts):
+    response = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [d.embedding for d in response.data]
 
 # ---- Read and parse file ----
 with open(FILE_PATH, "r", encoding="utf-8") as f:
@@ -33,11 +44,7 @@ for j, entry in enumerate(parsed_lines):
     if "embedding" not in entry or not entry["embedding"]:
         text = entry["text"]
         print(f"Embedding line {line_indexes[j]}: {text}")
-        response = client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        parsed_lines[j]["embedding"] = response.data[0].embedding
+        parsed_lines[j]["embedding"] = cached_embeddings([text], EMBEDDING_MODEL, embed_fn, cache)[0]
 
 # ---- Write updated file, preserving comments ----
 for obj, i in zip(parsed_lines, line_indexes):
@@ -46,4 +53,4 @@ for obj, i in zip(parsed_lines, line_indexes):
 with open(FILE_PATH, "w", encoding="utf-8") as f:
     f.writelines(original_lines)
 
-print("Embedding generation complete.")
+print(f"Embedding generation complete ({cache.stats()}).")
@@ -1,13 +1,17 @@
-import os
-import shutil
+import asyncio
+import tempfile
 import zipfile
 
+import requests
+import telebot
+from telebot.types import BotCommand
 import toml
 
-from intake_obsidian import intake
-from search_obsidian import search
+from intake_obsidian import intake_zip
+from search_obsidian import search_stream
 from openai import OpenAI
-from todoist import search as todoist_search
+from streaming import send_streamed, text_deltas
+from todoist import search_stream as todoist_search_stream
 
 # ---- CONFIG ----
 CONFIG = toml.load("config.toml")
@@ -17,6 +21,26 @@ EXAMPLES_PATH = "examples.jsonl"
 USER_PROFILE = CONFIG["prompts"]["user_profile"]
 BOT_PROFILE = CONFIG["prompts"]["bot_profile"]
 
+class SyncBotBridge:
+    """Lets synchronous agent code drive an AsyncTeleBot from a worker thread.
+
+    Coroutine methods are scheduled on the bot's event loop and waited for; everything
+    else (token, attributes) is passed through.
+    """
+
+    def __init__(self, bot, loop):
+        self._bot = bot
+        self._loop = loop
+
+    def __getattr__(self, name):
+        attr = getattr(self._bot, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(attr(*args, **kwargs), self._loop).result()
+        return call
+
 class Agent:
     def __init__(self, name):
         self.name = name
@@ -24,12 +48,20 @@ class Agent:
     def handle(self, bot, message):
         raise NotImplementedError("Agent must implement handle()")
 
+    async def handle_async(self, bot, message):
+        """Async counterpart of handle() for an AsyncTeleBot.
+
+        By default the blocking handle() runs on the event loop's executor, talking to the
+        bot through a SyncBotBridge. Agents with async-native clients can override this.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.handle, SyncBotBridge(bot, loop), message)
+
 class VaultAgent(Agent):
     def __init__(self, name, vault_name):
         super().__init__(name)
         self.vault = vault_name
         self.zip_filename = f"{vault_name}.zip"
-        self.dest_dir = f"./temp/{vault_name}"
 
     def handle(self, bot, message):
         if message.content_type == 'text':
@@ -38,7 +70,7 @@ class VaultAgent(Agent):
             self._handle_document(bot, message)
 
     def _handle_text(self, bot, message):
-        bot.send_message(message.chat.id, search(message.text, self.vault))
+        send_streamed(bot, message.chat.id, search_stream(message.text, self.vault))
 
     def _handle_document(self, bot, message):
         doc = message.document
@@ -51,37 +83,30 @@ class VaultAgent(Agent):
         bot.send_message(chat_id, f"New {self.vault} archive received.")
         print(f"New {self.vault} Obtained")
 
-        if os.path.exists(self.dest_dir):
-            shutil.rmtree(self.dest_dir)
-        os.makedirs(self.dest_dir, exist_ok=True)
-
-        zip_path = None
-        try:
-            file_info = bot.get_file(doc.file_id)
-            downloaded_file = bot.download_file(file_info.file_path)
-            zip_path = os.path.join(self.dest_dir, "temp.zip")
-
-            with open(zip_path, "wb") as f:
-                f.write(downloaded_file)
-
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(self.dest_dir)
-
-        except zipfile.BadZipFile:
-            bot.send_message(chat_id, "Failed to unzip file. Make sure it's a valid .zip archive.")
-            return
-        except Exception as e:
-            bot.send_message(chat_id, f"Error downloading or extracting: {e}")
-            return
-        finally:
-            if zip_path and os.path.exists(zip_path):
-                os.remove(zip_path)
-
-        try:
-            result = intake(self.dest_dir, self.vault, bot, chat_id)
-            bot.send_message(chat_id, result or "(intake returned nothing)")
-        except Exception as e:
-            bot.send_message(chat_id, f"Error running intake(): {str(e)}")
+        # Spool the archive to an anonymous temp file in blocks rather than holding it in memory;
+        # intake_zip then reads the markdown members straight out of it.
+        with tempfile.TemporaryFile() as archive:
+            try:
+                file_info = bot.get_file(doc.file_id)
+                url = (telebot.apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}").format(
+                    bot.token, file_info.file_path
+                )
+                with requests.get(url, stream=True, timeout=(10, 120)) as r:
+                    r.raise_for_status()
+                    for block in r.iter_content(chunk_size=1 << 16):
+                        archive.write(block)
+                archive.seek(0)
+            except Exception as e:
+                bot.send_message(chat_id, f"Error downloading archive: {e}")
+                return
+
+            try:
+                result = intake_zip(archive, self.vault, bot, chat_id)
+                bot.send_message(chat_id, result or "(intake returned nothing)")
+            except zipfile.BadZipFile:
+                bot.send_message(chat_id, "Failed to unzip file. Make sure it's a valid .zip archive.")
+            except Exception as e:
+                bot.send_message(chat_id, f"Error running intake(): {str(e)}")
 
 class PersonalNotesAgent(VaultAgent):
     def __init__(self):
@@ -98,8 +123,9 @@ class WeatherAgent(Agent):
 
     def handle(self, bot, message):
         client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.responses.create(
+        stream = client.responses.create(
             model="gpt-4.1",
+            stream=True,
             tools=[{"type": "web_search_preview"}],
             input=[
                 {
@@ -113,8 +139,7 @@ class WeatherAgent(Agent):
             ]
         )
 
-        print(response.output_text)
-        bot.send_message(message.chat.id, response.output_text)
+        print(send_streamed(bot, message.chat.id, text_deltas(stream)))
 
 
 class TaskAgent(Agent):
@@ -122,7 +147,7 @@ class TaskAgent(Agent):
         super().__init__("TaskMaster")
 
     def handle(self, bot, message):
-        bot.send_message(message.chat.id, f"{todoist_search(message.text)}")
+        send_streamed(bot, message.chat.id, todoist_search_stream(message.text))
 
 
 
@@ -132,3 +157,11 @@ bot_agents = {
     "use_weather": WeatherAgent(),
     "use_tasks": TaskAgent()
 }
+
+# Menu commands, one per agent above
+bot_commands = [
+    BotCommand("personal_notes", "Search your personal notes"),
+    BotCommand("ttrpg_notes", "Search TTRPG notes"),
+    BotCommand("use_weather", "Get the weather"),
+    BotCommand("use_tasks", "Manage your task list"),
+]
@@ -0,0 +1,79 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import xxhash
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def signature(hits):
+    """Hash of the retrieved chunk ids and their contents, independent of rank order."""
+    parts = sorted(f"{i}:{xxhash.xxh3_64_hexdigest(doc.encode('utf-8'))}" for i, doc, _ in hits)
+    return xxhash.xxh3_64_hexdigest("\n".join(parts).encode("utf-8"))
+
+
+class AnswerCache:
+    """LRU/TTL cache of generated answers for repeated or near-identical vault questions.
+
+    An entry is reused when the question retrieved exactly the same chunks (same ids and
+    content) and its query embedding is within `threshold` cosine similarity. Without an
+    embedding (lexical-only search) the query text must match exactly.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, vault, query, hits, embedding=None):
+        sig = signature(hits)
+        now = time.monotonic()
+        with self.lock:
+            for key, entry in reversed(self.entries.items()):
+                if entry["vault"] != vault or entry["signature"] != sig:
+                    continue
+                if now - entry["created"] > self.ttl:
+                    continue
+                if embedding is not None and entry["embedding"] is not None:
+                    match = cosine(embedding, entry["embedding"]) >= self.threshold
+                else:
+                    match = entry["query"] == query
+                if match:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["answer"]
+            self.misses += 1
+        return None
+
+    def put(self, vault, query, hits, answer, embedding=None):
+        with self.lock:
+            key = (vault, signature(hits), query)
+            self.entries[key] = {
+                "vault": vault,
+                "signature": key[1],
+                "query": query,
+                "embedding": embedding,
+                "files": {meta["filename"] for _, _, meta in hits},
+                "answer": answer,
+                "created": time.monotonic(),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, vault, filenames):
+        """Drop every answer for the vault that cited one of the given files."""
+        filenames = set(filenames)
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e["vault"] == vault and e["files"] & filenames]:
+                del self.entries[key]
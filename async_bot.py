@@ -0,0 +1,73 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot.async_telebot import AsyncTeleBot
+import toml
+from agents import bot_agents, bot_commands
+
+# ---- CONFIG ----
+CONFIG = toml.load("config.toml")
+TELEGRAM_TOKEN = CONFIG["telegram"]["token"]
+TELEGRAM_CONFIG = CONFIG["telegram"]
+BOT_CONFIG = CONFIG.get("bot", {})
+# Agent calls in progress at once across all chats.
+MAX_CONCURRENCY = BOT_CONFIG.get("async_concurrency", 256)
+# Threads available to agents whose handle_async runs blocking code on the executor.
+EXECUTOR_WORKERS = BOT_CONFIG.get("async_executor_workers", 64)
+
+
+def create_bot(token=TELEGRAM_TOKEN, agents=bot_agents, max_concurrency=MAX_CONCURRENCY):
+    """Build an AsyncTeleBot that routes messages to agents' handle_async()."""
+    bot = AsyncTeleBot(token)
+    user_sessions = {}
+    # chat_id -> [lock, handlers holding or waiting on it]; dropped when the count reaches 0.
+    chat_locks = {}
+    limit = asyncio.Semaphore(max_concurrency)
+
+    @bot.message_handler(commands=[c.command for c in bot_commands])
+    async def select(msg):
+        name = msg.text.split()[0].lstrip("/").split("@")[0]
+        user_sessions[msg.chat.id] = name
+        await bot.reply_to(msg, f"You are now using: {agents[name].name}")
+
+    @bot.message_handler(func=lambda msg: True, content_types=['text', 'document'])
+    async def route(msg):
+        selected = user_sessions.get(msg.chat.id)
+        if selected not in agents:
+            await bot.reply_to(msg, "Please choose a bot using the menu commands.")
+            return
+        # One message at a time per chat, in arrival order; chats run concurrently up to the limit.
+        entry = chat_locks.setdefault(msg.chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with limit:
+                    await agents[selected].handle_async(bot, msg)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del chat_locks[msg.chat.id]
+
+    return bot
+
+
+async def main():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS))
+    bot = create_bot()
+    await bot.set_my_commands(bot_commands)
+    if TELEGRAM_CONFIG.get("mode", "polling") == "webhook":
+        from webhook import serve_async
+        await serve_async(
+            bot,
+            TELEGRAM_CONFIG["webhook_url"],
+            host=TELEGRAM_CONFIG.get("webhook_host", "0.0.0.0"),
+            port=TELEGRAM_CONFIG.get("webhook_port", 8080),
+            secret_token=TELEGRAM_CONFIG.get("webhook_secret"),
+        )
+    else:
+        await bot.remove_webhook()
+        await bot.infinity_polling()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
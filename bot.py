@@ -1,51 +1,80 @@
+import threading
+
 import telebot
-from telebot.types import BotCommand
 import toml
-from agents import bot_agents
+from agents import bot_agents, bot_commands
+from dispatcher import ChatDispatcher
 
 # ---- CONFIG ----
 CONFIG = toml.load("config.toml")
 TELEGRAM_TOKEN = CONFIG["telegram"]["token"]
+TELEGRAM_CONFIG = CONFIG["telegram"]
+BOT_CONFIG = CONFIG.get("bot", {})
 
-bot = telebot.TeleBot(TELEGRAM_TOKEN)
+# Handlers only enqueue work, so run them on the polling thread to keep per-chat arrival order.
+bot = telebot.TeleBot(TELEGRAM_TOKEN, threaded=False)
 user_sessions = {}
+sessions_lock = threading.Lock()
+dispatcher = ChatDispatcher(
+    max_workers=BOT_CONFIG.get("workers", 8),
+    max_pending=BOT_CONFIG.get("max_pending", 64),
+)
 
-# Register menu commands
-bot.set_my_commands([
-    BotCommand("personal_notes", "Search your personal notes"),
-    BotCommand("ttrpg_notes", "Search TTRPG notes"),
-    BotCommand("use_weather", "Get the weather"),
-    BotCommand("use_tasks", "Manage your task list"),
-])
+def select_agent(msg, name):
+    with sessions_lock:
+        user_sessions[msg.chat.id] = name
 
 
 # Handler registration
 @bot.message_handler(commands=["personal_notes"])
 def select_personal(msg):
-    user_sessions[msg.chat.id] = "personal_notes"
+    select_agent(msg, "personal_notes")
     bot.reply_to(msg, f"You are now using: {bot_agents['personal_notes'].name}")
 
 @bot.message_handler(commands=["ttrpg_notes"])
 def select_ttrpg(msg):
-    user_sessions[msg.chat.id] = "ttrpg_notes"
+    select_agent(msg, "ttrpg_notes")
     bot.reply_to(msg, f"You are now using: {bot_agents['ttrpg_notes'].name}")
 
 @bot.message_handler(commands=["use_weather"])
 def select_weather(msg):
-    user_sessions[msg.chat.id] = "use_weather"
+    select_agent(msg, "use_weather")
     bot.reply_to(msg, f"You are now using: {bot_agents['use_weather'].name}")
 
 @bot.message_handler(commands=["use_tasks"])
 def select_tasks(msg):
-    user_sessions[msg.chat.id] = "use_tasks"
+    select_agent(msg, "use_tasks")
     bot.reply_to(msg, f"You are now using: {bot_agents['use_tasks'].name}")
 
 @bot.message_handler(func=lambda msg: True, content_types=['text', 'document'])
 def route(msg):
-    selected = user_sessions.get(msg.chat.id)
-    if selected in bot_agents:
-        bot_agents[selected].handle(bot, msg)
-    else:
+    # Resolve the agent now, so a message sent before switching bots goes to the bot it was sent to.
+    with sessions_lock:
+        selected = user_sessions.get(msg.chat.id)
+    if selected not in bot_agents:
         bot.reply_to(msg, "Please choose a bot using the menu commands.")
+        return
+    # A newer question supersedes queued ones; archive uploads are always processed.
+    queued = dispatcher.submit(
+        msg.chat.id, bot_agents[selected].handle, bot, msg,
+        supersedable=msg.content_type == "text",
+    )
+    if not queued:
+        bot.reply_to(msg, "I'm busy with other requests right now, please try again in a moment.")
 
-bot.infinity_polling()
+
+if __name__ == "__main__":
+    # Register menu commands
+    bot.set_my_commands(bot_commands)
+    if TELEGRAM_CONFIG.get("mode", "polling") == "webhook":
+        from webhook import serve
+        serve(
+            bot,
+            TELEGRAM_CONFIG["webhook_url"],
+            host=TELEGRAM_CONFIG.get("webhook_host", "0.0.0.0"),
+            port=TELEGRAM_CONFIG.get("webhook_port", 8080),
+            secret_token=TELEGRAM_CONFIG.get("webhook_secret"),
+        )
+    else:
+        bot.remove_webhook()
+        bot.infinity_polling()
@@ -0,0 +1,129 @@
+import re
+import tiktoken
+
+enc = tiktoken.encoding_for_model("gpt-4o")
+
+HEADING = re.compile(r"^#{1,6}\s")
+FENCE = re.compile(r"^(```|~~~)")
+LIST_ITEM = re.compile(r"^\s*([-*+]|\d+[.)])\s")
+
+
+def blocks(text):
+    """Split markdown into structural blocks: frontmatter, headings, code fences, lists and paragraphs.
+
+    Returns (kind, text) pairs. Code fences and frontmatter are never broken up at blank lines.
+    """
+    lines = text.split("\n")
+    out = []
+    current, kind = [], None
+
+    def close():
+        nonlocal current, kind
+        block = "\n".join(current).strip()
+        if block:
+            out.append((kind, block))
+        current, kind = [], None
+
+    i = 0
+    if lines and lines[0].strip() == "---":
+        for j in range(1, len(lines)):
+            if lines[j].strip() in ("---", "..."):
+                out.append(("frontmatter", "\n".join(lines[:j + 1])))
+                i = j + 1
+                break
+
+    while i < len(lines):
+        line = lines[i]
+        fence = FENCE.match(line.lstrip())
+        if fence:
+            close()
+            marker = fence.group(1)
+            current, kind = [line], "code"
+            i += 1
+            while i < len(lines):
+                current.append(lines[i])
+                i += 1
+                if lines[i - 1].lstrip().startswith(marker):
+                    break
+            close()
+            continue
+        if not line.strip():
+            # Blank lines end paragraphs but not lists, so loose lists stay together.
+            if kind == "list":
+                current.append(line)
+            else:
+                close()
+        elif HEADING.match(line):
+            close()
+            out.append(("heading", line.strip()))
+        elif LIST_ITEM.match(line):
+            if kind != "list":
+                close()
+                kind = "list"
+            current.append(line)
+        elif kind == "list" and (line.startswith((" ", "\t")) or current[-1].strip()):
+            current.append(line)
+        else:
+            if kind == "list":
+                close()
+            kind = kind or "paragraph"
+            current.append(line)
+        i += 1
+    close()
+    return out
+
+
+def split_tokens(tokens, size, overlap=0):
+    """Slice a token list into windows of at most `size` tokens, each sharing `overlap` with the last."""
+    step = max(1, size - overlap)
+    windows = []
+    for start in range(0, len(tokens), step):
+        windows.append(tokens[start:start + size])
+        if start + size >= len(tokens):
+            break
+    return windows
+
+
+def chunk_markdown(text, target_tokens=512, overlap_tokens=64):
+    """Pack markdown blocks into chunks of about `target_tokens`, tokenizing each block once.
+
+    Chunks break preferentially before headings, consecutive chunks share `overlap_tokens`
+    tokens, and a single block larger than the target is split into token windows.
+    Returns (text, token_count) pairs.
+    """
+    parsed = blocks(text)
+    if not parsed:
+        return []
+    encoded = enc.encode_batch([b for _, b in parsed], disallowed_special=())
+    sep = enc.encode("\n\n")
+
+    chunks = []
+    current = []
+
+    for (kind, _), tokens in zip(parsed, encoded):
+        if len(tokens) > target_tokens:
+            # Keep a short lead-in (typically the section heading) attached to the oversize block.
+            if current and len(current) < target_tokens // 2:
+                tokens = current + sep + tokens
+            elif current:
+                chunks.append(current)
+            windows = split_tokens(tokens, target_tokens, overlap_tokens)
+            chunks.extend(windows[:-1])
+            current = list(windows[-1])
+            continue
+
+        size = len(current) + (len(sep) if current else 0) + len(tokens)
+        # Start a new chunk when this block would overflow it, or at a heading once it is half full.
+        if current and (size > target_tokens or (kind == "heading" and len(current) >= target_tokens // 2)):
+            chunks.append(current)
+            current = current[-overlap_tokens:] if overlap_tokens and kind != "heading" else []
+        current = current + (sep if current else []) + tokens
+    if current:
+        chunks.append(current)
+
+    out = []
+    for c in chunks:
+        chunk = enc.decode(c).strip()
+        if chunk:
+            out.append((chunk, len(c)))
+    return out
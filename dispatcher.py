@@ -0,0 +1,64 @@
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Job:
+    def __init__(self, fn, args, supersedable):
+        self.fn = fn
+        self.args = args
+        self.supersedable = supersedable
+
+
+class ChatDispatcher:
+    """Runs handlers on a bounded worker pool, one at a time per chat and in arrival order.
+
+    Chats never block each other beyond the pool size. At most `max_pending` jobs may be
+    queued or running at once; submit() refuses more so the caller can push back.
+    """
+
+    def __init__(self, max_workers=8, max_pending=64):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.queues = {}
+
+    def submit(self, chat_id, fn, *args, supersedable=False):
+        """Queue fn(*args) behind the chat's earlier jobs. Returns False if the pool is saturated.
+
+        A supersedable job cancels the chat's supersedable jobs that have not started yet,
+        so a burst of messages is answered once, for the latest one.
+        """
+        if not self.slots.acquire(blocking=False):
+            return False
+        with self.lock:
+            queue = self.queues.get(chat_id)
+            idle = queue is None
+            if idle:
+                queue = self.queues[chat_id] = deque()
+            if supersedable:
+                for old in [j for j in queue if j.supersedable]:
+                    queue.remove(old)
+                    self.slots.release()
+            queue.append(_Job(fn, args, supersedable))
+        if idle:
+            self.pool.submit(self._run_next, chat_id)
+        return True
+
+    def _run_next(self, chat_id):
+        with self.lock:
+            job = self.queues[chat_id].popleft()
+        try:
+            job.fn(*job.args)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.slots.release()
+            with self.lock:
+                more = bool(self.queues[chat_id])
+                if not more:
+                    del self.queues[chat_id]
+            # Requeue at the back of the pool rather than looping, so a busy chat cannot hog a worker.
+            if more:
+                self.pool.submit(self._run_next, chat_id)
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import threading
+from array import array
+
+import xxhash
+
+CACHE_PATH = "./cache/embeddings.sqlite3"
+# SQLite caps the number of bound parameters per statement.
+LOOKUP_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """Persistent embeddings keyed by an xxhash of the model name and the exact input text."""
+
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, model):
+        return xxhash.xxh3_128_hexdigest(f"{model}\0{text}".encode("utf-8"))
+
+    def get_many(self, texts, model):
+        """Return one vector per text, or None where the text has not been embedded before."""
+        keys = [self.key(t, model) for t in texts]
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                part = keys[i:i + LOOKUP_BATCH_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part
+                )
+                found.update(rows)
+            vectors = [array("f", found[k]).tolist() if k in found else None for k in keys]
+            hits = sum(v is not None for v in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts, vectors, model):
+        rows = [(self.key(t, model), array("f", v).tobytes()) for t, v in zip(texts, vectors)]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def stats(self):
+        return f"embedding cache: {self.hits} hit(s), {self.misses} miss(es)"
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = EmbeddingCache()
+        return _default
+
+
+def cached_embeddings(texts, model, embed_fn, cache=None):
+    """Return one vector per text, calling embed_fn only for the texts missing from the cache."""
+    cache = cache or default_cache()
+    vectors = cache.get_many(texts, model)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = embed_fn([texts[i] for i in missing])
+        cache.put_many([texts[i] for i in missing], fresh, model)
+        for i, v in zip(missing, fresh):
+            vectors[i] = v
+    return vectors
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import tiktoken
+
+HISTORY_PATH = "./cache/history.sqlite3"
+# Claude's tokenizer is not public; an OpenAI encoding is close enough for budgeting.
+enc = tiktoken.encoding_for_model("gpt-4o")
+# Per-message framing overhead (role, separators) added on top of the content tokens.
+MESSAGE_OVERHEAD = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def message_tokens(message):
+    n = MESSAGE_OVERHEAD
+    content = message.get("content")
+    if isinstance(content, str):
+        n += len(enc.encode(content, disallowed_special=()))
+    elif content:
+        n += len(enc.encode(json.dumps(content), disallowed_special=()))
+    if message.get("tool_calls"):
+        n += len(enc.encode(json.dumps(message["tool_calls"]), disallowed_special=()))
+    return n
+
+
+def history_tokens(history):
+    return sum(message_tokens(m) for m in history)
+
+
+def turns(history):
+    """Split a history into turns, each starting at a user message.
+
+    An assistant message's tool_calls and the tool messages answering them always fall in
+    the same turn, so dropping whole turns never leaves an orphaned tool result.
+    """
+    out = []
+    for message in history:
+        if message.get("role") == "user" or not out:
+            out.append([])
+        out[-1].append(message)
+    return out
+
+
+class HistoryStore:
+    """Per-chat conversation histories kept within a token budget.
+
+    save() compacts a history before storing it: tool results from earlier turns are cut
+    to `tool_result_tokens`, and when the total still exceeds `max_tokens` the oldest turns
+    (beyond the last `keep_turns`) are folded into a running summary by `summarize`, or
+    dropped if no summarizer is given. At most `max_chats` chats are held in memory and
+    chats idle for `idle_ttl` seconds are evicted; with a `path` they are persisted to
+    SQLite and reloaded on demand.
+    """
+
+    def __init__(self, max_tokens=6000, keep_turns=4, tool_result_tokens=300,
+                 max_chats=500, idle_ttl=6 * 3600, path=None, summarize=None):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.tool_result_tokens = tool_result_tokens
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        self.summarize = summarize
+        self.chats = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS histories (chat_id TEXT PRIMARY KEY, updated REAL NOT NULL, messages TEXT NOT NULL)"
+            )
+            self.conn.commit()
+
+    def load(self, chat_id):
+        """Return a copy of the chat's history, restoring it from disk if it was evicted."""
+        with self.lock:
+            self._evict_idle()
+            entry = self.chats.get(chat_id)
+            if entry is None and self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT messages FROM histories WHERE chat_id = ?", (str(chat_id),)
+                ).fetchone()
+                if row:
+                    entry = self.chats[chat_id] = {"messages": json.loads(row[0]), "used": time.monotonic()}
+            if entry is None:
+                return []
+            entry["used"] = time.monotonic()
+            self.chats.move_to_end(chat_id)
+            return list(entry["messages"])
+
+    def save(self, chat_id, history):
+        history = self.compact(history)
+        with self.lock:
+            self.chats[chat_id] = {"messages": history, "used": time.monotonic()}
+            self.chats.move_to_end(chat_id)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO histories (chat_id, updated, messages) VALUES (?, ?, ?)",
+                    (str(chat_id), time.time(), json.dumps(history))
+                )
+                self.conn.commit()
+            while len(self.chats) > self.max_chats:
+                self.chats.popitem(last=False)
+        return history
+
+    def reset(self, chat_id):
+        with self.lock:
+            self.chats.pop(chat_id, None)
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM histories WHERE chat_id = ?", (str(chat_id),))
+                self.conn.commit()
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        while self.chats:
+            chat_id, entry = next(iter(self.chats.items()))
+            if entry["used"] >= cutoff:
+                break
+            del self.chats[chat_id]
+
+    def _truncate(self, content):
+        tokens = enc.encode(content, disallowed_special=())
+        if len(tokens) <= self.tool_result_tokens:
+            return content
+        return enc.decode(tokens[:self.tool_result_tokens]) + f" …[truncated {len(tokens) - self.tool_result_tokens} tokens]"
+
+    def compact(self, history):
+        parts = turns(history)
+        summary = None
+        if parts and parts[0][0].get("role") == "system" and parts[0][0].get("content", "").startswith(SUMMARY_PREFIX):
+            summary = parts[0].pop(0)["content"][len(SUMMARY_PREFIX):]
+            if not parts[0]:
+                parts.pop(0)
+
+        # Old tool results are rarely needed verbatim; the model can call the tool again.
+        for turn in parts[:-1]:
+            for i, message in enumerate(turn):
+                if message.get("role") == "tool" and isinstance(message.get("content"), str):
+                    turn[i] = {**message, "content": self._truncate(message["content"])}
+
+        stale = []
+        total = sum(history_tokens(t) for t in parts)
+        while len(parts) > self.keep_turns and total > self.max_tokens:
+            turn = parts.pop(0)
+            total -= history_tokens(turn)
+            stale.extend(turn)
+        if stale and self.summarize:
+            try:
+                summary = self.summarize(summary, stale)
+            except Exception as e:
+                print(f"History summarization failed, dropping {len(stale)} messages: {e}")
+
+        out = [{"role": "system", "content": SUMMARY_PREFIX + summary}] if summary else []
+        for turn in parts:
+            out.extend(turn)
+        return out
@@ -1,28 +1,100 @@
 import os
+import random
+import zipfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import toml
 import xxhash
-from pathlib import Path
-from openai import OpenAI
-import chromadb
-import tiktoken
+from pathlib import Path, PurePosixPath
+from openai import OpenAI, RateLimitError, APIConnectionError, InternalServerError
+from chunker import enc, chunk_markdown, split_tokens
+from embedding_cache import default_cache
+from lexical_index import default_index
+from search_obsidian import refresh_known_vaults, invalidate_answers
+from vector_store import default_store
 
 
 
-DB_PATH = "./chroma_db"
 CONFIG = toml.load("config.toml")
 OPENAI_API_KEY = CONFIG["openai"]["api"]
 EMBEDDING_MODEL = "text-embedding-3-large"
+# OpenAI caps an embeddings request at 2048 inputs and 300k tokens; stay under the token cap
+# because tiktoken's gpt-4o encoding does not match the embedding model's exactly.
+BATCH_MAX_INPUTS = 2048
+BATCH_MAX_TOKENS = 250_000
+# The embedding model accepts 8192 tokens per input. Counts from the gpt-4o encoding run lower than
+# the model's own, so leave headroom.
+MAX_INPUT_TOKENS = 7500
+# Rows per store upsert/delete call; each call pays one commit (and, for Chroma, an HNSW persist).
+WRITE_BATCH_SIZE = 1000
+READ_BLOCK_SIZE = 1 << 16
+EMBEDDING_CONFIG = CONFIG.get("embedding", {})
+EMBED_CONCURRENCY = EMBEDDING_CONFIG.get("concurrency", 4)
+EMBED_TOKENS_PER_MINUTE = EMBEDDING_CONFIG.get("tokens_per_minute", 1_000_000)
+EMBED_MAX_RETRIES = EMBEDDING_CONFIG.get("max_retries", 6)
+CHUNK_TOKENS = EMBEDDING_CONFIG.get("chunk_tokens", 512)
+CHUNK_OVERLAP = EMBEDDING_CONFIG.get("chunk_overlap", 64)
 
 # --- INIT ---
-client = OpenAI(api_key=OPENAI_API_KEY)
-chroma = chromadb.PersistentClient(path=DB_PATH)
-collection = chroma.get_or_create_collection(name="vault_index")
-enc = tiktoken.encoding_for_model("gpt-4o")
+# Retries are handled by embed_batch so every worker backs off together on a 429.
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+store = default_store()
+cache = default_cache()
+lexical = default_index()
+
+# --- RATE LIMITING ---
+class TokenBudget:
+    """Sliding one-minute token budget shared by the embedding workers."""
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.used = 0
+        self.paused_until = 0.0
+
+    def acquire(self, tokens):
+        tokens = min(tokens, self.per_minute)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.window and now - self.window[0][0] >= 60:
+                    self.used -= self.window.popleft()[1]
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.used + tokens <= self.per_minute:
+                        self.window.append((now, tokens))
+                        self.used += tokens
+                        return
+                    wait = 60 - (now - self.window[0][0])
+            time.sleep(max(wait, 0.05))
+
+    def pause(self, seconds):
+        """Hold back every worker, e.g. after the server asks us to slow down."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+budget = TokenBudget(EMBED_TOKENS_PER_MINUTE)
+
+def _retry_after(err):
+    response = getattr(err, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
 
 # --- HELPERS ---
-def is_valid_path(path, VAULT):
-    parts = path.relative_to(VAULT).parts
+def is_valid_path(parts):
     for part in parts:
         if part.startswith("."):
             return False
@@ -30,118 +102,295 @@ def is_valid_path(path, VAULT):
             return False
     return True
 
-def embed(text):
-    if not isinstance(text, str):
-        raise ValueError("Text must be a string")
-    text = text.strip()
-    if not text:
-        raise ValueError("Refusing to embed empty or whitespace-only string")
-    if len(enc.encode(text)) > 8192:
-        text = text[:8192 * 4]
-        print(f"Text too long to embed (likely >8192 tokens). Dividing by 4.\n{text[:100]}...")
-        if len(enc.encode(text)) > 8192:
-            text = text[:8192 * 2]
-            print(f"Still too long. Dividing again.\n{text[:100]}...")
-            if len(enc.encode(text)) > 8192:
-                text = text[:8192]
-                print(f"Still too long. Truncating.\n{text[:100]}...")
-    result = client.embeddings.create(input=[text], model=EMBEDDING_MODEL)
-    return result.data[0].embedding
+def hash_stream(f):
+    h = xxhash.xxh3_64()
+    for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+        h.update(block)
+    return h.hexdigest()
 
-def intake(VAULT, vault_label, bot=None, chat_id=None):
+def decode(data):
+    # Same result as Path.read_text(encoding="utf-8"), which applies universal newlines.
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+def directory_entries(VAULT):
+    """Yield (relpath, opener) for every indexable markdown file under a directory."""
+    VAULT = Path(VAULT)
+    for file in VAULT.rglob("*.md"):
+        relpath = file.relative_to(VAULT)
+        if is_valid_path(relpath.parts):
+            yield relpath.as_posix(), (lambda file=file: file.open("rb"))
+
+def zip_entries(zf):
+    """Yield (relpath, opener) for every indexable markdown member, without extracting anything."""
+    for info in zf.infolist():
+        if info.is_dir() or not info.filename.endswith(".md"):
+            continue
+        if is_valid_path(PurePosixPath(info.filename).parts):
+            yield info.filename, (lambda info=info: zf.open(info))
+
+def embed_batch(texts, tokens=0):
+    budget.acquire(tokens)
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            result = client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+            return [d.embedding for d in sorted(result.data, key=lambda d: d.index)]
+        except (RateLimitError, APIConnectionError, InternalServerError) as err:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            delay = _retry_after(err) or min(60, 2 ** attempt) * random.uniform(0.5, 1.0)
+            if isinstance(err, RateLimitError):
+                budget.pause(delay)
+            print(f"Embedding request failed ({type(err).__name__}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def batches(records):
+    """Group records into requests that respect the per-request input and token limits."""
+    batch, batch_tokens = [], 0
+    for record in records:
+        tokens = record["tokens"]
+        if batch and (len(batch) >= BATCH_MAX_INPUTS or batch_tokens + tokens > BATCH_MAX_TOKENS):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(record)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def chunk_records(relpath, content, h, vault_label):
+    """Build the part 0 and chunk records for one file, ready to be embedded."""
+    body = content.strip()
+    prefix = f"Filename: {relpath}\nContent:\n"
+    prefix_tokens = len(enc.encode(prefix))
+    if not body:
+        # Still record the hash on a part 0 row (embedding just the filename), or the
+        # empty note would look changed on every intake.
+        return [{
+            "id": f"{vault_label}::{relpath}::0",
+            "document": content,
+            "metadata": {"filename": relpath, "part": 0, "xxhash": h, "vault": vault_label},
+            "input": prefix,
+            "tokens": prefix_tokens,
+        }]
+
+    records = []
+
+    # --- Part 0: Full file, split into as many vectors as the input limit requires ---
+    body_tokens = enc.encode(body, disallowed_special=())
+    segments = split_tokens(body_tokens, MAX_INPUT_TOKENS - prefix_tokens)
+    for k, segment in enumerate(segments):
+        metadata = {"filename": relpath, "part": 0, "xxhash": h, "vault": vault_label}
+        if len(segments) > 1:
+            metadata["segment"] = k
+        document = content if len(segments) == 1 else enc.decode(segment)
+        records.append({
+            "id": f"{vault_label}::{relpath}::0" + (f".{k}" if k else ""),
+            "document": document,
+            "metadata": metadata,
+            "input": prefix + (body if len(segments) == 1 else document),
+            "tokens": prefix_tokens + len(segment),
+        })
+
+    # --- Chunking ---
+    for i, (chunk, tokens) in enumerate(chunk_markdown(content, CHUNK_TOKENS, CHUNK_OVERLAP), start=1):
+        records.append({
+            "id": f"{vault_label}::{relpath}::{i}",
+            "document": chunk,
+            "metadata": {"filename": relpath, "part": i, "vault": vault_label},
+            "input": prefix + chunk,
+            "tokens": prefix_tokens + tokens,
+        })
+    return records
+
+def file_hashes(vault_label):
+    """Map each file stored for the vault to the xxhash recorded on its part 0 row."""
+    return {meta["filename"]: meta.get("xxhash") for _, _, meta in store.find(vault=vault_label, part=0)}
+
+def ids_for_files(vault_label, filenames):
+    """Return the ids of every row the vault stores for the given files.
+
+    Matches on metadata rather than id prefix so rows written before ids were
+    namespaced by vault are found too.
+    """
+    filenames = list(filenames)
+    ids = []
+    for i in range(0, len(filenames), WRITE_BATCH_SIZE):
+        ids.extend(i for i, _, _ in store.find(vault=vault_label, filenames=filenames[i:i + WRITE_BATCH_SIZE]))
+    return ids
+
+def delete_ids(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), WRITE_BATCH_SIZE):
+        store.delete(ids[i:i + WRITE_BATCH_SIZE])
+    lexical.delete(ids)
+
+def backfill_lexical(vault_label):
+    """Load a vault's stored chunks into the lexical index, for vaults indexed before it existed."""
+    offset = 0
+    while True:
+        rows = store.find(vault=vault_label, documents=True, limit=WRITE_BATCH_SIZE, offset=offset)
+        if not rows:
+            break
+        ids, documents, metadatas = zip(*rows)
+        lexical.upsert(ids, documents, metadatas)
+        offset += len(rows)
 
-    def update(message, bot):
+class BulkWriter:
+    """Buffers rows for a run and commits them to the vector store in sized upserts."""
+
+    def __init__(self, size=WRITE_BATCH_SIZE):
+        self.size = size
+        self.ids, self.documents, self.embeddings, self.metadatas = [], [], [], []
+        self.written = set()
+        self.markers = []
+
+    def add(self, record, embedding):
+        # Part 0 rows carry the hash that marks a file as indexed. Hold them back until every
+        # chunk is written so a run interrupted mid-file is picked up again on the next intake.
+        if "xxhash" in record["metadata"]:
+            self.markers.append((record, embedding))
+            return
+        self._append(record, embedding)
+
+    def _append(self, record, embedding):
+        self.ids.append(record["id"])
+        self.documents.append(record["document"])
+        self.embeddings.append(embedding)
+        self.metadatas.append(record["metadata"])
+        if len(self.ids) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.ids:
+            return
+        store.upsert(self.ids, self.documents, self.embeddings, self.metadatas)
+        lexical.upsert(self.ids, self.documents, self.metadatas)
+        self.written.update(self.ids)
+        self.ids, self.documents, self.embeddings, self.metadatas = [], [], [], []
+
+    def close(self):
+        self.flush()
+        for record, embedding in self.markers:
+            self._append(record, embedding)
+        self.markers = []
+        self.flush()
+
+def _reporter(bot, chat_id):
+    def update(message):
         if bot and chat_id:
             bot.send_message(chat_id, message)
         else:
             print(message)
+    return update
+
+def intake(VAULT, vault_label, bot=None, chat_id=None):
+    return _intake(directory_entries(VAULT), vault_label, _reporter(bot, chat_id))
+
+def intake_zip(zip_file, vault_label, bot=None, chat_id=None):
+    """Index a vault straight from a zip archive (a path or a seekable file object).
+
+    Only markdown members are read; they are hashed from their member streams and
+    decoded only when the hash differs from the stored one.
+    """
+    with zipfile.ZipFile(zip_file) as zf:
+        return _intake(zip_entries(zf), vault_label, _reporter(bot, chat_id))
+
+def _intake(entries, vault_label, update):
+    entries = dict(entries)
 
-    VAULT = Path(VAULT)
     # --- LOAD EXISTING METADATA ---
-    vault_files = {str(f.relative_to(VAULT)) for f in VAULT.rglob("*.md")}
-    existing = collection.get(include=["metadatas", "documents"])
-    existing_files = {
-        meta["filename"]
-        for meta in existing["metadatas"]
-        if meta["part"] == 0
-    }
+    vault_files = set(entries)
+    hashes = file_hashes(vault_label)
+    existing_files = set(hashes)
+    if hashes and lexical.count(vault_label) == 0:
+        backfill_lexical(vault_label)
 
     # --- DELETE MISSING FILES ---
     deleted = existing_files - vault_files
-    for f in deleted:
-        collection.delete(where={"filename": f})
+    delete_ids(ids_for_files(vault_label, deleted))
 
     # --- DETECTION PHASE ---
     update_queue = []
 
-    for file in VAULT.rglob("*.md"):
-        if not is_valid_path(file, VAULT):
+    for relpath, opener in entries.items():
+        with opener() as f:
+            h = hash_stream(f)
+        if hashes.get(relpath) == h:
             continue
 
-        relpath = str(file.relative_to(VAULT))
-        content = file.read_text(encoding="utf-8")
-        h = xxhash.xxh3_64_hexdigest(content)
-
-        file_entry = [
-            m for m in existing["metadatas"]
-            if m["filename"] == relpath and m["part"] == 0
-        ]
-
-        if not file_entry or file_entry[0].get("xxhash") != h:
-            update_queue.append((file, relpath, content, h))
+        with opener() as f:
+            try:
+                content = decode(f.read())
+            except UnicodeDecodeError as err:
+                update(f"Skipping {relpath}: not valid UTF-8 ({err})")
+                continue
+        update_queue.append((relpath, content, h))
 
     # --- INDEXING PHASE ---
     total_files = len(update_queue)
     if total_files == 0:
-        update("No files to update.", bot)
-    else:
-        update(f"Starting to process {total_files} modified file(s)...", bot)
+        if deleted:
+            refresh_known_vaults()
+            invalidate_answers(vault_label, deleted)
+        return "No files to update."
+    update(f"Starting to process {total_files} modified file(s)...")
+
+    stale_ids = set(ids_for_files(vault_label, (relpath for relpath, _, _ in update_queue)))
+    records = []
+    for relpath, content, h in update_queue:
+        records.extend(chunk_records(relpath, content, h, vault_label))
 
-    percent_step = max(1, total_files // 10)
+    total = len(records)
+    percent_step = max(1, total // 10)
     next_threshold = percent_step
+    writer = BulkWriter()
+    hits, misses = cache.hits, cache.misses
 
-    for index, (file, relpath, content, h) in enumerate(update_queue, start=1):
-        collection.delete(where={"filename": relpath})
-
-        # --- Part 0: Full file ---
-        full_input = f"Filename: {relpath}\nContent:\n{content}"
-        full_emb = embed(full_input)
-        collection.add(
-            documents=[content],
-            embeddings=[full_emb],
-            metadatas=[{"filename": relpath, "part": 0, "xxhash": h, "vault": vault_label}],
-            ids=[f"{relpath}::0"]
-        )
-
-        # --- Chunking ---
-        raw_chunks = [c.strip() for c in content.split("\n\n") if c.strip()]
-        chunks = []
-        for chunk in raw_chunks:
-            if len(chunk) < 10 and chunks:
-                chunks[-1] += "\n\n" + chunk
-            else:
-                chunks.append(chunk)
-
-        for i, chunk in enumerate(chunks, start=1):
-            try:
-                chunk_input = f"Filename: {relpath}\nContent:\n{chunk}"
-                e = embed(chunk_input)
-                collection.add(
-                    documents=[chunk],
-                    embeddings=[e],
-                    metadatas=[{"filename": relpath, "part": i, "vault": vault_label}],
-                    ids=[f"{relpath}::{i}"]
-                )
-            except ValueError as err:
-                update(f"Skipping chunk in {relpath} (part {i}): {err}", bot)
-
-        if index >= next_threshold or index == total_files:
-            percent = int(100 * index / total_files)
-            update(f"Progress: {percent}% ({index}/{total_files} files indexed)", bot)
-            next_threshold += percent_step
+    # Chunks whose exact input was embedded before (unchanged parts of a modified file) skip the API.
+    pending = []
+    for record, e in zip(records, cache.get_many([r["input"] for r in records], EMBEDDING_MODEL)):
+        if e is None:
+            pending.append(record)
+        else:
+            writer.add(record, e)
+    done = total - len(pending)
+
+    # Several requests are in flight at once; this thread is the only one writing to the cache and Chroma.
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool:
+        futures = {
+            pool.submit(embed_batch, [r["input"] for r in batch], sum(r["tokens"] for r in batch)): batch
+            for batch in batches(pending)
+        }
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                embeddings = future.result()
+                cache.put_many([r["input"] for r in batch], embeddings, EMBEDDING_MODEL)
+                for record, e in zip(batch, embeddings):
+                    writer.add(record, e)
+
+                done += len(batch)
+                if done >= next_threshold or done == total:
+                    percent = int(100 * done / total)
+                    update(f"Progress: {percent}% ({done}/{total} chunks from {total_files} file(s) indexed)")
+                    while next_threshold <= done:
+                        next_threshold += percent_step
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    writer.close()
+    # Rows from chunks that no longer exist (files that shrank) are removed once the new ones are in.
+    delete_ids(stale_ids - writer.written)
+    refresh_known_vaults()
+    invalidate_answers(vault_label, deleted | {relpath for relpath, _, _ in update_queue})
 
+    return (
+        f"Indexed {total} chunk(s) from {total_files} file(s); "
+        f"embedding cache: {cache.hits - hits} hit(s), {cache.misses - misses} miss(es)."
+    )
 
 if __name__ == "__main__":
     vault = "/Users/graylott/Obsidian/Wanderland/Wanderland/"
 
-    intake(vault, "wanderland")
\ No newline at end of file
+    print(intake(vault, "wanderland"))
\ No newline at end of file
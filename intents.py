@@ -0,0 +1,102 @@
+import re
+
+# Due phrases Todoist's own due_string parser understands, recognised at the end of a command.
+WEEKDAY = r"(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+TIME = r"at \d{1,2}(?::\d{2})?\s*(?:am|pm)?"
+DUE = (
+    rf"(?:(?:today|tonight|tomorrow)(?: (?:morning|afternoon|evening))?(?: {TIME})?"
+    rf"|(?:on |next |this )?{WEEKDAY}(?: {TIME})?"
+    rf"|{TIME}"
+    rf"|every (?:day|week|month|year|{WEEKDAY})(?: {TIME})?"
+    rf"|in \d+ (?:days?|weeks?)"
+    rf"|\d{{4}}-\d{{2}}-\d{{2}})"
+)
+# Task text the fast path will not touch: Todoist filter operators and quick-add markers.
+CONTENT = r"[^#@&|!()*\n]+?"
+
+CREATE = re.compile(
+    rf"^(?:please\s+)?(?:add|create)\s+(?:(?:an?\s+)?(?:new\s+)?(?:task|todo|reminder)\s*(?:to\s+|for\s+|:\s*)?)?"
+    rf"(?P<content>{CONTENT})(?:\s+(?:due\s+)?(?P<due>{DUE}))?[.!]*$",
+    re.I,
+)
+REMIND = re.compile(rf"^remind me to\s+(?P<content>{CONTENT})(?:\s+(?P<due>{DUE}))?[.!]*$", re.I)
+CLOSE = re.compile(
+    rf"^(?:please\s+)?(?:(?:complete|close|finish|check off|done:?)\s+(?:the\s+)?(?P<a>{CONTENT})"
+    rf"|mark\s+(?:the\s+)?(?P<b>{CONTENT})\s+(?:as\s+)?(?:done|completed?|finished))(?:\s+task)?[.!]*$",
+    re.I,
+)
+# Only the explicit "what's due <when>" / "show my tasks (due) <when>" / "show overdue tasks"
+# forms; anything more conversational about a day goes to the model.
+LIST = re.compile(
+    r"^(?:what(?:'s|\s+is|\s+are)\s+(?:my\s+tasks\s+)?due"
+    r"|(?:show|list)\s+(?:me\s+)?(?:my\s+)?(?:tasks|todos)(?:\s+(?:due|for))?)"
+    r"\s+(?P<when>today|tomorrow|this week)[?.!]*$",
+    re.I,
+)
+LIST_OVERDUE = re.compile(
+    r"^(?:what(?:'s|\s+is|\s+are)\s+(?:my\s+tasks\s+)?overdue"
+    r"|(?:show|list)\s+(?:me\s+)?(?:my\s+)?overdue\s+(?:tasks|todos))[?.!]*$",
+    re.I,
+)
+# Questions about past actions, negations or advice are never a plain due-date listing.
+NOT_A_LISTING = re.compile(
+    r"\b(?:did|done|complet\w*|finish\w*|delet\w*|not|\w+n't|without|except|should|prioriti[sz]e)\b", re.I
+)
+LIST_FILTERS = {
+    "today": ("today", "today"),
+    "tomorrow": ("tomorrow", "tomorrow"),
+    "overdue": ("overdue", "overdue"),
+    "this week": ("7 days", "in the next 7 days"),
+}
+# Anything scoped to a project, section, label or priority needs the model to resolve it.
+SCOPED = re.compile(r"\b(?:projects?|sections?|labels?|priority|p[1-4])\b", re.I)
+# Task text that names a destination ("milk to my shopping list", "eggs to shopping").
+TARGETED = re.compile(r"\b(?:to|in|into|under)\s+\w", re.I)
+# Task text that is only a filler word left over from the command phrasing.
+FILLER = {"a", "an", "the", "for", "to", "it", "this", "that", "something", "task", "todo", "reminder"}
+# Task text opening with a particle or determiner is a phrasal verb or a request for the
+# model ("add up my tasks", "create a summary of ..."), not something to put on the list.
+LEADING = re.compile(
+    r"^(?:up|down|out|off|over|back|away|together|a|an|the|some|any|all|every|each|my|your|our|their"
+    r"|this|that|these|those|more)\b",
+    re.I,
+)
+# Close commands covering more than one task are left to the model.
+QUANTIFIED = re.compile(r"\b(?:all|every|everything|each|any|tasks|todos)\b", re.I)
+
+
+def _task_text(content):
+    """The task text of a command, or None if it is filler, a bare due phrase, names a list
+    or opens with a particle or determiner."""
+    content = content.strip()
+    if (content.lower() in FILLER or re.fullmatch(DUE, content, re.I) or TARGETED.search(content)
+            or LEADING.match(content)):
+        return None
+    return content
+
+
+def parse_intent(text):
+    """Recognise a simple, unambiguous task command.
+
+    Returns ("create", {"content", "due"}), ("close", {"content"}) or
+    ("list", {"filter", "label"}), or None when the message needs the full tool loop.
+    """
+    text = (text or "").strip()
+    if not text or "\n" in text or SCOPED.search(text):
+        return None
+    m = LIST.match(text)
+    if m or LIST_OVERDUE.match(text):
+        if NOT_A_LISTING.search(text):
+            return None
+        todoist_filter, label = LIST_FILTERS[m.group("when").lower() if m else "overdue"]
+        return "list", {"filter": todoist_filter, "label": label}
+    m = CREATE.match(text) or REMIND.match(text)
+    if m:
+        content = _task_text(m.group("content"))
+        return ("create", {"content": content, "due": m.group("due")}) if content else None
+    m = CLOSE.match(text)
+    if m:
+        content = _task_text(m.group("a") or m.group("b"))
+        if content and len(content) >= 3 and not QUANTIFIED.search(content):
+            return "close", {"content": content}
+    return None
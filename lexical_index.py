@@ -0,0 +1,121 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+INDEX_PATH = "./cache/lexical.sqlite3"
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+TOKEN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "for", "from", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "with", "you",
+}
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 inverted index over vault chunks, persisted in SQLite and kept in step by intake.
+
+    Only chunk rows (part >= 1) are indexed; part 0 holds whole notes that would
+    duplicate the chunk text.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY, vault TEXT NOT NULL, filename TEXT NOT NULL, part INTEGER NOT NULL,
+                length INTEGER NOT NULL, document TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_vault ON docs (vault);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, vault TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, length INTEGER NOT NULL,
+                PRIMARY KEY (term, vault, id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_id ON postings (id);
+        """)
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def _delete(self, ids):
+        self.conn.executemany("DELETE FROM postings WHERE id = ?", [(i,) for i in ids])
+        self.conn.executemany("DELETE FROM docs WHERE id = ?", [(i,) for i in ids])
+
+    def upsert(self, ids, documents, metadatas):
+        rows = [
+            (i, d, m) for i, d, m in zip(ids, documents, metadatas)
+            if m.get("part", 0) >= 1
+        ]
+        with self.lock:
+            self._delete([i for i, _, _ in rows])
+            for i, document, meta in rows:
+                terms = Counter(tokenize(document))
+                length = sum(terms.values())
+                self.conn.execute(
+                    "INSERT INTO docs (id, vault, filename, part, length, document) VALUES (?, ?, ?, ?, ?, ?)",
+                    (i, meta["vault"], meta["filename"], meta["part"], length, document)
+                )
+                self.conn.executemany(
+                    "INSERT INTO postings (term, vault, id, tf, length) VALUES (?, ?, ?, ?, ?)",
+                    [(term, meta["vault"], i, tf, length) for term, tf in terms.items()]
+                )
+            self.conn.commit()
+
+    def delete(self, ids):
+        with self.lock:
+            self._delete(list(ids))
+            self.conn.commit()
+
+    def count(self, vault):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM docs WHERE vault = ?", (vault,)).fetchone()[0]
+
+    def search(self, query, vault, top_k=5):
+        """Return the top_k (id, document, metadata) hits for query, ranked by BM25."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self.lock:
+            n, avgdl = self.conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM docs WHERE vault = ?", (vault,)
+            ).fetchone()
+            if not n:
+                return []
+            scores = Counter()
+            for term in terms:
+                postings = self.conn.execute(
+                    "SELECT id, tf, length FROM postings WHERE term = ? AND vault = ?", (term, vault)
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for i, tf, length in postings:
+                    scores[i] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / (avgdl or 1)))
+            hits = []
+            for i, _ in scores.most_common(top_k):
+                filename, part, document = self.conn.execute(
+                    "SELECT filename, part, document FROM docs WHERE id = ?", (i,)
+                ).fetchone()
+                hits.append((i, document, {"filename": filename, "part": part, "vault": vault}))
+        return hits
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_index():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LexicalIndex()
+        return _default
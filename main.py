@@ -1,9 +1,19 @@
 import os
 import json
+import re
 import uuid
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import telebot
 import toml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from history import HISTORY_PATH, HistoryStore
+from intents import parse_intent
+from tool_results import encode_item, encode_list
 
 # --- CONFIG ---
 CONFIG = toml.load("config.toml")
@@ -27,7 +37,12 @@ except json.JSONDecodeError:
     raise ValueError("The 'tools.json' file is not valid JSON.")
 
 # --- STATE ---
-conversation_histories = {}
+# Histories are created further down, once summarize_history can call OpenRouter.
+HISTORY_CONFIG = CONFIG.get("history", {})
+# Read-only tool calls issued together in one model step run concurrently on this pool.
+tool_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+# Calls without side effects; identical ones between two writes are executed once.
+READ_ONLY_TOOLS = {"get_tasks", "get_task", "get_projects", "get_project", "get_labels", "get_sections"}
 
 # --- TODOIST REST v2 BASE ---
 TODOIST_BASE = "https://api.todoist.com/rest/v2"
@@ -39,23 +54,115 @@ AUTH_HEADERS = {
     "Authorization": f"Bearer {TODOIST_API_TOKEN}",
 }
 
+# --- HTTP SESSIONS ---
+# One keep-alive session per upstream, retrying 429/5xx with jittered exponential backoff
+# and honouring Retry-After. Todoist POSTs are retried on any failure: writes carry an
+# X-Request-Id that is reused across retries, so a retried write is applied once.
+# OpenRouter completions are never retried after the request was sent (read=0): a read
+# timeout there would otherwise re-run, and re-bill, a minute-long generation.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def _retry(**overrides):
+    return Retry(**{
+        "total": 4,
+        "backoff_factor": 0.5,
+        "backoff_jitter": 0.5,
+        "status_forcelist": RETRY_STATUSES,
+        "allowed_methods": None,
+        "respect_retry_after_header": True,
+        "raise_on_status": False,
+        **overrides,
+    })
+
+def _make_session(headers, retry):
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.headers.update(headers)
+    return session
+
+todoist_http = _make_session(AUTH_HEADERS, _retry())
+openrouter_http = _make_session({
+    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+    "X-Title": "Todoist Telegram Bot",
+    "Content-Type": "application/json",
+}, _retry(read=0, other=0))
+
+def _idempotent(headers):
+    return {**headers, "X-Request-Id": str(uuid.uuid4())}
+
 def _safe_json(r):
     try:
         return r.json()
     except ValueError:
         return {"_non_json_body": r.text}
 
+# --- REFERENCE DATA CACHE ---
+# Projects, sections and labels change rarely but are needed on almost every turn to map
+# names to ids. They are fetched whole, kept for REFERENCE_TTL seconds, and dropped by the
+# helpers that modify them.
+REFERENCE_TTL = 300
+_reference = {}
+_reference_lock = threading.Lock()
+
+def _reference_items(kind):
+    """All projects/sections/labels as returned by the API, cached for REFERENCE_TTL."""
+    with _reference_lock:
+        cached = _reference.get(kind)
+        if cached and time.monotonic() - cached[0] < REFERENCE_TTL:
+            return cached[1]
+    r = todoist_http.get(f"{TODOIST_BASE}/{kind}", headers=AUTH_HEADERS, timeout=(5, 20))
+    r.raise_for_status()
+    items = _safe_json(r)
+    with _reference_lock:
+        _reference[kind] = (time.monotonic(), items)
+    return items
+
+def _invalidate_reference(*kinds):
+    with _reference_lock:
+        for kind in kinds:
+            _reference.pop(kind, None)
+
+def _find_by_name(items, name):
+    name = name.strip().casefold()
+    for item in items:
+        if (item.get("name") or "").strip().casefold() == name:
+            return item
+    return None
+
+def project_id_for(name):
+    project = _find_by_name(_reference_items("projects"), name)
+    return project.get("id") if project else None
+
+def section_id_for(name, project_id=None):
+    sections = [s for s in _reference_items("sections")
+                if project_id is None or str(s.get("project_id")) == str(project_id)]
+    section = _find_by_name(sections, name)
+    return section.get("id") if section else None
+
+def _not_found(kind, name):
+    return json.dumps({"status": "error", "message": f"No {kind} named '{name}'."})
+
 # --- TODOIST HELPERS (REST v2) ---
 
-def create_task(content, **kwargs):
+def create_task(content, project_name=None, section_name=None, **kwargs):
     """Create task. Accepts: content, description, project_id, section_id, parent_id, order,
-       labels (list[str]), priority (1-4), due_string, due_date, due_datetime, due_lang."""
+       labels (list[str]), priority (1-4), due_string, due_date, due_datetime, due_lang.
+       project_name/section_name are resolved to ids locally from the cached lists."""
     try:
+        if project_name and not kwargs.get("project_id"):
+            kwargs["project_id"] = project_id_for(project_name)
+            if not kwargs["project_id"]:
+                return _not_found("project", project_name)
+        if section_name and not kwargs.get("section_id"):
+            kwargs["section_id"] = section_id_for(section_name, kwargs.get("project_id"))
+            if not kwargs["section_id"]:
+                return _not_found("section", section_name)
         api_url = f"{TODOIST_BASE}/tasks"
-        headers = {**JSON_HEADERS, "X-Request-Id": str(uuid.uuid4())}
+        headers = _idempotent(JSON_HEADERS)
         payload = {"content": content}
         payload.update({k: v for k, v in kwargs.items() if v is not None})
-        r = requests.post(api_url, headers=headers, json=payload, timeout=(5, 20))
+        r = todoist_http.post(api_url, headers=headers, json=payload, timeout=(5, 20))
         r.raise_for_status()
         task = _safe_json(r)
         return json.dumps({"status": "success",
@@ -65,30 +172,33 @@ def create_task(content, **kwargs):
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
-def get_tasks(**kwargs):
-    """List active tasks. Supports project_id, label, filter, ids (comma-separated), etc."""
+def _fetch_tasks(**params):
+    r = todoist_http.get(f"{TODOIST_BASE}/tasks", headers=AUTH_HEADERS,
+                         params={k: v for k, v in params.items() if v is not None}, timeout=(5, 20))
+    r.raise_for_status()
+    return _safe_json(r)
+
+def get_tasks(project_name=None, cursor=0, **kwargs):
+    """List active tasks. Supports project_id, project_name, label, filter, ids (comma-separated), etc.
+       Returns one page of PAGE_SIZE tasks starting at cursor."""
     try:
-        api_url = f"{TODOIST_BASE}/tasks"
-        params = {k: v for k, v in kwargs.items() if v is not None}
-        r = requests.get(api_url, headers=AUTH_HEADERS, params=params, timeout=(5, 20))
-        r.raise_for_status()
-        tasks = _safe_json(r)
+        if project_name and not kwargs.get("project_id"):
+            kwargs["project_id"] = project_id_for(project_name)
+            if not kwargs["project_id"]:
+                return _not_found("project", project_name)
+        tasks = _fetch_tasks(**kwargs)
         if not tasks:
             return json.dumps({"status": "success", "message": "No tasks found matching the criteria."})
-        formatted = [{"id": t.get("id"),
-                      "content": t.get("content"),
-                      "due": t.get("due"),
-                      "project_id": t.get("project_id")} for t in tasks]
-        return json.dumps({"status": "success", "tasks": formatted})
+        return encode_list("tasks", tasks, cursor)
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
 def get_task(task_id):
     try:
-        r = requests.get(f"{TODOIST_BASE}/tasks/{task_id}", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.get(f"{TODOIST_BASE}/tasks/{task_id}", headers=AUTH_HEADERS, timeout=(5, 20))
         r.raise_for_status()
-        return json.dumps(_safe_json(r))
+        return encode_item("tasks", _safe_json(r))
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
@@ -96,7 +206,7 @@ def get_task(task_id):
 def update_task(task_id, **kwargs):
     """Update task. Same fields as create_task (appropriate subset)."""
     try:
-        r = requests.post(f"{TODOIST_BASE}/tasks/{task_id}", headers=JSON_HEADERS,
+        r = todoist_http.post(f"{TODOIST_BASE}/tasks/{task_id}", headers=_idempotent(JSON_HEADERS),
                           json={k: v for k, v in kwargs.items() if v is not None},
                           timeout=(5, 20))
         r.raise_for_status()
@@ -107,7 +217,7 @@ def update_task(task_id, **kwargs):
 
 def close_task(task_id):
     try:
-        r = requests.post(f"{TODOIST_BASE}/tasks/{task_id}/close", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.post(f"{TODOIST_BASE}/tasks/{task_id}/close", headers=_idempotent(AUTH_HEADERS), timeout=(5, 20))
         r.raise_for_status()
         return json.dumps({"status": "success", "message": f"Task {task_id} completed."})
     except requests.exceptions.RequestException as e:
@@ -116,7 +226,7 @@ def close_task(task_id):
 
 def reopen_task(task_id):
     try:
-        r = requests.post(f"{TODOIST_BASE}/tasks/{task_id}/reopen", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.post(f"{TODOIST_BASE}/tasks/{task_id}/reopen", headers=_idempotent(AUTH_HEADERS), timeout=(5, 20))
         r.raise_for_status()
         return json.dumps({"status": "success", "message": f"Task {task_id} reopened."})
     except requests.exceptions.RequestException as e:
@@ -125,7 +235,7 @@ def reopen_task(task_id):
 
 def delete_task(task_id):
     try:
-        r = requests.delete(f"{TODOIST_BASE}/tasks/{task_id}", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.delete(f"{TODOIST_BASE}/tasks/{task_id}", headers=AUTH_HEADERS, timeout=(5, 20))
         r.raise_for_status()
         return json.dumps({"status": "success", "message": f"Task {task_id} deleted."})
     except requests.exceptions.RequestException as e:
@@ -134,42 +244,40 @@ def delete_task(task_id):
 
 def create_project(name, **kwargs):
     try:
-        r = requests.post(f"{TODOIST_BASE}/projects", headers=JSON_HEADERS,
+        r = todoist_http.post(f"{TODOIST_BASE}/projects", headers=_idempotent(JSON_HEADERS),
                           json={"name": name, **{k: v for k, v in kwargs.items() if v is not None}},
                           timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("projects")
         p = _safe_json(r)
         return json.dumps({"status": "success", "message": f"Project '{p.get('name')}' created.", "project_id": p.get('id')})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
-def get_projects():
+def get_projects(cursor=0):
     try:
-        r = requests.get(f"{TODOIST_BASE}/projects", headers=AUTH_HEADERS, timeout=(5, 20))
-        r.raise_for_status()
-        projects = _safe_json(r)
-        formatted = [{"id": p.get("id"), "name": p.get("name")} for p in projects]
-        return json.dumps({"status": "success", "projects": formatted})
+        return encode_list("projects", _reference_items("projects"), cursor)
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
 def get_project(project_id):
     try:
-        r = requests.get(f"{TODOIST_BASE}/projects/{project_id}", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.get(f"{TODOIST_BASE}/projects/{project_id}", headers=AUTH_HEADERS, timeout=(5, 20))
         r.raise_for_status()
-        return json.dumps(_safe_json(r))
+        return encode_item("projects", _safe_json(r))
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
 def update_project(project_id, **kwargs):
     try:
-        r = requests.post(f"{TODOIST_BASE}/projects/{project_id}", headers=JSON_HEADERS,
+        r = todoist_http.post(f"{TODOIST_BASE}/projects/{project_id}", headers=_idempotent(JSON_HEADERS),
                           json={k: v for k, v in kwargs.items() if v is not None},
                           timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("projects")
         return json.dumps({"status": "success", "message": f"Project {project_id} updated."})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
@@ -177,8 +285,9 @@ def update_project(project_id, **kwargs):
 
 def delete_project(project_id):
     try:
-        r = requests.delete(f"{TODOIST_BASE}/projects/{project_id}", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.delete(f"{TODOIST_BASE}/projects/{project_id}", headers=AUTH_HEADERS, timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("projects", "sections")
         return json.dumps({"status": "success", "message": f"Project {project_id} deleted."})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
@@ -186,8 +295,9 @@ def delete_project(project_id):
 
 def archive_project(project_id):
     try:
-        r = requests.post(f"{TODOIST_BASE}/projects/{project_id}/archive", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.post(f"{TODOIST_BASE}/projects/{project_id}/archive", headers=_idempotent(AUTH_HEADERS), timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("projects", "sections")
         return json.dumps({"status": "success", "message": f"Project {project_id} archived."})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
@@ -195,8 +305,9 @@ def archive_project(project_id):
 
 def unarchive_project(project_id):
     try:
-        r = requests.post(f"{TODOIST_BASE}/projects/{project_id}/unarchive", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.post(f"{TODOIST_BASE}/projects/{project_id}/unarchive", headers=_idempotent(AUTH_HEADERS), timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("projects", "sections")
         return json.dumps({"status": "success", "message": f"Project {project_id} unarchived."})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
@@ -204,56 +315,52 @@ def unarchive_project(project_id):
 
 def create_section(name, project_id, **kwargs):
     try:
-        r = requests.post(f"{TODOIST_BASE}/sections", headers=JSON_HEADERS,
+        r = todoist_http.post(f"{TODOIST_BASE}/sections", headers=_idempotent(JSON_HEADERS),
                           json={"name": name, "project_id": project_id, **{k: v for k, v in kwargs.items() if v is not None}},
                           timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("sections")
         s = _safe_json(r)
         return json.dumps({"status": "success", "message": f"Section '{s.get('name')}' created.", "section_id": s.get('id')})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
-def get_sections(**kwargs):
+def get_sections(cursor=0, **kwargs):
     try:
-        r = requests.get(f"{TODOIST_BASE}/sections", headers=AUTH_HEADERS,
-                         params={k: v for k, v in kwargs.items() if v is not None},
-                         timeout=(5, 20))
-        r.raise_for_status()
-        secs = _safe_json(r)
-        formatted = [{"id": s.get("id"), "name": s.get("name"), "project_id": s.get("project_id")} for s in secs]
-        return json.dumps({"status": "success", "sections": formatted})
+        project_id = kwargs.get("project_id")
+        secs = [s for s in _reference_items("sections")
+                if project_id is None or str(s.get("project_id")) == str(project_id)]
+        return encode_list("sections", secs, cursor)
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
 def create_label(name, **kwargs):
     try:
-        r = requests.post(f"{TODOIST_BASE}/labels", headers=JSON_HEADERS,
+        r = todoist_http.post(f"{TODOIST_BASE}/labels", headers=_idempotent(JSON_HEADERS),
                           json={"name": name, **{k: v for k, v in kwargs.items() if v is not None}},
                           timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("labels")
         lbl = _safe_json(r)
         return json.dumps({"status": "success", "message": f"Label '{lbl.get('name')}' created.", "label_id": lbl.get('id')})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
-def get_labels():
+def get_labels(cursor=0):
     try:
-        r = requests.get(f"{TODOIST_BASE}/labels", headers=AUTH_HEADERS, timeout=(5, 20))
-        r.raise_for_status()
-        labels = _safe_json(r)
-        formatted = [{"id": l.get("id"), "name": l.get("name"), "is_favorite": l.get("is_favorite")} for l in labels]
-        return json.dumps({"status": "success", "labels": formatted})
+        return encode_list("labels", _reference_items("labels"), cursor)
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
         return json.dumps({"status": "error", "message": f"API Error: {body}"})
 
 def delete_label(label_id):
     try:
-        r = requests.delete(f"{TODOIST_BASE}/labels/{label_id}", headers=AUTH_HEADERS, timeout=(5, 20))
+        r = todoist_http.delete(f"{TODOIST_BASE}/labels/{label_id}", headers=AUTH_HEADERS, timeout=(5, 20))
         r.raise_for_status()
+        _invalidate_reference("labels")
         return json.dumps({"status": "success", "message": f"Label {label_id} deleted."})
     except requests.exceptions.RequestException as e:
         body = e.response.text if getattr(e, "response", None) else str(e)
@@ -290,36 +397,145 @@ available_tools = {
 }
 
 # --- OPENROUTER CALL ---
+OPENROUTER_CONFIG = CONFIG.get("openrouter", {})
+OPENROUTER_MODEL = OPENROUTER_CONFIG.get("model", "anthropic/claude-3.5-sonnet")
+
+# Only tools with an implementation are offered, in tools.json order. Tools, then this
+# system prompt, form a byte-identical prefix on every call; the cache_control breakpoint
+# lets the provider cache it, so later steps only pay for the new history.
+implemented_tools = [t for t in tools_definition if t["function"]["name"] in available_tools]
+unimplemented = sorted({t["function"]["name"] for t in tools_definition} - set(available_tools))
+if unimplemented:
+    print(f"Not offering unimplemented tools: {', '.join(unimplemented)}")
+
+SYSTEM_PROMPT = (
+    "You manage the user's Todoist account through the provided tools. "
+    "Prefer project_name/section_name over looking up ids first. "
+    "List results are CSV pages; pass the given cursor to read more. "
+    "Answer briefly once the request is done."
+)
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}],
+}
 
-def call_openrouter(history):
+# Optional per-message tool subset: a family of tools is offered only when the message
+# mentions it. Smaller requests, but a different subset changes the cached prefix.
+TOOL_FAMILIES = {
+    "project": re.compile(r"\bprojects?\b", re.I),
+    "section": re.compile(r"\bsections?\b", re.I),
+    "label": re.compile(r"\b(labels?|tags?|@\w+)", re.I),
+}
+_tool_subsets = {}
+
+def select_tools(user_text):
+    """Tools to offer for a message: all implemented ones, or a cached subset if enabled."""
+    if not OPENROUTER_CONFIG.get("tool_subset", False):
+        return implemented_tools
+    families = frozenset(f for f, pattern in TOOL_FAMILIES.items() if pattern.search(user_text or ""))
+    if families not in _tool_subsets:
+        _tool_subsets[families] = [
+            t for t in implemented_tools
+            if not any(f in t["function"]["name"] for f in TOOL_FAMILIES if f not in families)
+        ]
+    return _tool_subsets[families]
+
+def call_openrouter(history, tools=None):
     try:
-        response = requests.post(
+        response = openrouter_http.post(
             url="https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "X-Title": "Todoist Telegram Bot",
-                "Content-Type": "application/json"
-            },
             json={
-                "model": "anthropic/claude-3.5-sonnet",
-                "messages": history,
-                "tools": tools_definition,
+                "model": OPENROUTER_MODEL,
+                "messages": [SYSTEM_MESSAGE, *history],
+                "tools": implemented_tools if tools is None else tools,
                 "tool_choice": "auto",
+                "usage": {"include": True},
             },
             timeout=(10, 60),
         )
         response.raise_for_status()
-        return response.json()
+        body = response.json()
+        usage = body.get("usage") or {}
+        if usage:
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            print(f"OpenRouter prompt tokens: {cached} cached, {usage.get('prompt_tokens', 0) - cached} uncached, "
+                  f"{usage.get('completion_tokens', 0)} completion")
+        return body
     except requests.exceptions.RequestException as e:
         print(f"Error calling OpenRouter: {e}")
         return None
 
+def summarize_history(summary, messages):
+    """Fold stale messages into the running conversation summary with a tool-less call."""
+    transcript = "\n".join(
+        f"{m.get('role')}: {m.get('content') or json.dumps(m.get('tool_calls'))}" for m in messages
+    )
+    response = openrouter_http.post(
+        url="https://openrouter.ai/api/v1/chat/completions",
+        json={
+            "model": HISTORY_CONFIG.get("summary_model", "anthropic/claude-3.5-haiku"),
+            "messages": [{
+                "role": "user",
+                "content": "Update the summary of this Todoist assistant conversation with the new messages. "
+                           "Keep names, ids, dates and decisions the user may refer back to; be brief.\n\n"
+                           f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}",
+            }],
+        },
+        timeout=(10, 60),
+    )
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+conversation_histories = HistoryStore(
+    max_tokens=HISTORY_CONFIG.get("max_tokens", 6000),
+    keep_turns=HISTORY_CONFIG.get("keep_turns", 4),
+    tool_result_tokens=HISTORY_CONFIG.get("tool_result_tokens", 300),
+    max_chats=HISTORY_CONFIG.get("max_chats", 500),
+    idle_ttl=HISTORY_CONFIG.get("idle_ttl", 6 * 3600),
+    path=HISTORY_PATH if HISTORY_CONFIG.get("persist", False) else None,
+    summarize=summarize_history,
+)
+
+# --- FAST PATH ---
+# Simple create/complete/list commands are run directly with a templated reply, saving
+# the two model round trips of the tool loop. Anything ambiguous returns None and goes
+# to the model.
+
+def fast_path(user_text):
+    if not OPENROUTER_CONFIG.get("fast_path", False):
+        return None
+    intent = parse_intent(user_text)
+    if intent is None:
+        return None
+    kind, args = intent
+    try:
+        if kind == "create":
+            result = json.loads(create_task(args["content"], due_string=args["due"]))
+            if result.get("status") != "success":
+                return None
+            return f"Added '{args['content']}'" + (f", due {args['due']}." if args["due"] else ".")
+        if kind == "close":
+            matches = _fetch_tasks(filter=f"search: {args['content']}")
+            if len(matches) != 1:
+                return None
+            result = json.loads(close_task(matches[0]["id"]))
+            if result.get("status") != "success":
+                return None
+            return f"Completed '{matches[0]['content']}'."
+        if kind == "list":
+            tasks = _fetch_tasks(filter=args["filter"])
+            if not tasks:
+                return f"Nothing due {args['label']}."
+            return f"Due {args['label']}:\n" + "\n".join(f"- {t['content']}" for t in tasks)
+    except requests.exceptions.RequestException as e:
+        print(f"Fast path failed, falling back to the model: {e}")
+    return None
+
 # --- TELEGRAM HANDLERS ---
 
 @bot.message_handler(commands=['start', 'help'])
 def send_welcome(message):
-    if message.chat.id in conversation_histories:
-        del conversation_histories[message.chat.id]
+    conversation_histories.reset(message.chat.id)
     welcome_text = (
         "Todoist assistant ready.\n"
         "Examples:\n"
@@ -345,22 +561,66 @@ def _parse_tool_args(tool_call):
             return {}
     return {}
 
+def execute_tool(function_name, function_args):
+    if function_name not in available_tools:
+        return json.dumps({"status": "error", "message": f"Tool '{function_name}' not found."})
+    try:
+        return available_tools[function_name](**function_args)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": f"Error executing tool: {str(e)}"})
+
+def run_tool_calls(tool_calls):
+    """Execute one step's tool calls; returns their responses in call order.
+
+    Runs of consecutive read-only calls execute concurrently, and repeats within a run
+    share a single execution. Any other call may depend on or affect its neighbours
+    (create_project then create_task(project_name=...), update_task then close_task), so
+    it runs alone, after every earlier call and before every later one.
+    """
+    responses = [None] * len(tool_calls)
+    pending = {}
+
+    def drain():
+        for key, (future, indexes) in pending.items():
+            for i in indexes:
+                responses[i] = future.result()
+        pending.clear()
+
+    for i, tool_call in enumerate(tool_calls):
+        function_name = tool_call.get('function', {}).get('name')
+        function_args = _parse_tool_args(tool_call)
+        if function_name in READ_ONLY_TOOLS:
+            key = (function_name, json.dumps(function_args, sort_keys=True))
+            if key not in pending:
+                pending[key] = (tool_pool.submit(execute_tool, function_name, function_args), [])
+            pending[key][1].append(i)
+        else:
+            drain()
+            responses[i] = execute_tool(function_name, function_args)
+    drain()
+    return responses
+
 @bot.message_handler(func=lambda message: True)
 def handle_message(message):
     chat_id = message.chat.id
     user_text = message.text
 
-    if chat_id not in conversation_histories:
-        conversation_histories[chat_id] = []
-
-    history = conversation_histories[chat_id]
+    history = conversation_histories.load(chat_id)
     history.append({"role": "user", "content": user_text})
 
+    reply = fast_path(user_text)
+    if reply is not None:
+        bot.reply_to(message, reply)
+        history.append({"role": "assistant", "content": reply})
+        conversation_histories.save(chat_id, history)
+        return
+
     bot.send_chat_action(chat_id, 'typing')
+    tools = select_tools(user_text)
 
     max_steps = 5
     for _ in range(max_steps):
-        llm_response = call_openrouter(history)
+        llm_response = call_openrouter(history, tools)
         if not llm_response or not llm_response.get('choices'):
             bot.reply_to(message, "Upstream error.")
             return
@@ -370,22 +630,11 @@ def handle_message(message):
 
         tool_calls = response_message.get("tool_calls")
         if tool_calls:
-            for tool_call in tool_calls:
-                function_name = tool_call.get('function', {}).get('name')
-                if function_name in available_tools:
-                    function_to_call = available_tools[function_name]
-                    try:
-                        function_args = _parse_tool_args(tool_call)
-                        function_response = function_to_call(**function_args)
-                    except Exception as e:
-                        function_response = json.dumps({"status": "error", "message": f"Error executing tool: {str(e)}"})
-                else:
-                    function_response = json.dumps({"status": "error", "message": f"Tool '{function_name}' not found."})
-
+            for tool_call, function_response in zip(tool_calls, run_tool_calls(tool_calls)):
                 history.append({
                     "tool_call_id": tool_call.get('id'),
                     "role": "tool",
-                    "name": function_name,
+                    "name": tool_call.get('function', {}).get('name'),
                     "content": function_response,
                 })
 
@@ -398,7 +647,7 @@ def handle_message(message):
     else:
         bot.reply_to(message, "Exceeded tool loop steps.")
 
-    conversation_histories[chat_id] = history
+    conversation_histories.save(chat_id, history)
 
 
 if __name__ == '__main__':
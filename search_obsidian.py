@@ -1,32 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import toml
 from openai import OpenAI
-import chromadb
+from answer_cache import AnswerCache
+from embedding_cache import cached_embeddings
+from lexical_index import default_index
+from streaming import text_deltas
+from vector_store import default_store
 
 # --- IMPORTS ---
 CONFIG = toml.load("config.toml")
 OPENAI_API_KEY = CONFIG["openai"]["api"]
 EMBEDDING_MODEL = "text-embedding-3-large"
-DB_PATH = "./chroma_db"
-
-def search(search_text, vault_label, top_k=5):
-
-    # --- INIT ---
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    chroma = chromadb.PersistentClient(path=DB_PATH)
-    collection = chroma.get_collection("vault_index")
-
-    # Check if the vault exists
-    all_metadata = collection.get(include=["metadatas"])["metadatas"]
-    if vault_label not in {m.get("vault") for m in all_metadata if "vault" in m}:
-        return f'"{vault_label}" is not a vault.'
-
-    # --- EMBED QUERY ---
-    def embed(text):
-        result = client.embeddings.create(input=[text], model=EMBEDDING_MODEL)
-        return result.data[0].embedding
-
-    # --- OPTIMIZE INPUT ---
-    user_query = search_text.strip()
+SEARCH_CONFIG = CONFIG.get("search", {})
+# Run the raw query through retrieval while gpt-4o-mini rewrites it, then fuse both result lists.
+PARALLEL_REWRITE = SEARCH_CONFIG.get("parallel_rewrite", True)
+# Queries with fewer words than this are already terse and skip the rewrite.
+REWRITE_MIN_WORDS = SEARCH_CONFIG.get("rewrite_min_words", 6)
+# Seconds to wait for the rewritten query's results before answering from the raw query alone.
+REWRITE_TIMEOUT = SEARCH_CONFIG.get("rewrite_timeout", 4.0)
+RRF_K = SEARCH_CONFIG.get("rrf_k", 60)
+# "vector", "lexical" (BM25 only, no query embedding) or "hybrid" (both, fused).
+SEARCH_MODE = SEARCH_CONFIG.get("mode", "hybrid")
+# Answer short keyword queries straight from the BM25 index, with no network calls. Off by
+# default: the reply is raw snippets, and short requests ("Summarize my week") look the same.
+KEYWORD_FAST_PATH = SEARCH_CONFIG.get("keyword_fast_path", False)
+KEYWORD_MAX_WORDS = SEARCH_CONFIG.get("keyword_max_words", 3)
+ANSWER_CACHE_SIZE = SEARCH_CONFIG.get("answer_cache_size", 256)
+ANSWER_CACHE_TTL = SEARCH_CONFIG.get("answer_cache_ttl", 3600)
+# Cosine similarity above which two questions retrieving the same chunks share an answer.
+ANSWER_CACHE_THRESHOLD = SEARCH_CONFIG.get("answer_cache_threshold", 0.95)
+QUESTION_WORDS = {"who", "what", "when", "where", "why", "how", "which", "is", "are", "do", "does", "did", "can", "should"}
+
+# --- INIT ---
+# Shared by every search; the client pools its connections and both are safe to use across threads.
+client = OpenAI(api_key=OPENAI_API_KEY)
+store = default_store()
+pool = ThreadPoolExecutor(max_workers=8)
+lexical = default_index()
+answers = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+
+_known_vaults = None
+_vaults_lock = threading.Lock()
+
+def refresh_known_vaults():
+    """Reload the set of indexed vaults. intake calls this when it finishes a run."""
+    global _known_vaults
+    vaults = {m["vault"] for _, _, m in store.find(part=0) if "vault" in m}
+    with _vaults_lock:
+        _known_vaults = vaults
+    return vaults
+
+def known_vaults():
+    with _vaults_lock:
+        vaults = _known_vaults
+    return vaults if vaults is not None else refresh_known_vaults()
+
+def is_vault(vault_label):
+    """Whether vault_label is indexed, reloading the cached set once before saying no.
+
+    Another process (a separate intake run) may have indexed it since the set was loaded.
+    """
+    return vault_label in known_vaults() or vault_label in refresh_known_vaults()
+
+def invalidate_answers(vault_label, filenames):
+    """Forget cached answers citing files that intake changed or removed."""
+    answers.invalidate(vault_label, filenames)
+
+# --- EMBED QUERY ---
+def _embed_fn(texts):
+    result = client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+    return [d.embedding for d in result.data]
+
+def embed(text):
+    return cached_embeddings([text], EMBEDDING_MODEL, _embed_fn)[0]
+
+# --- OPTIMIZE INPUT ---
+def rewrite(user_query):
     optimize_prompt = (
         "You are a query optimizer for a semantic search engine.\n"
         "Rewrite the user's input as a concise, standalone search query.\n"
@@ -39,20 +89,88 @@ def search(search_text, vault_label, top_k=5):
     ).output_text.strip()
 
     print(f"Optimized Query: {optimized}")
-    query_embedding = embed(optimized)
-
-    # --- SEARCH DB ---
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
-        include=["documents", "metadatas"],
-        where={"vault": vault_label}
+    return optimized
+
+# --- SEARCH DB ---
+def retrieve(text, vault_label, top_k):
+    """Return the top_k (id, document, metadata) hits for text within a vault."""
+    return store.query(embed(text), vault_label, top_k)
+
+def fuse(rankings, top_k, k=RRF_K):
+    """Reciprocal-rank fusion of several hit lists, keyed by row id."""
+    scores, hits = {}, {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            scores[hit[0]] = scores.get(hit[0], 0.0) + 1.0 / (k + rank + 1)
+            hits.setdefault(hit[0], hit)
+    return [hits[i] for i in sorted(scores, key=scores.get, reverse=True)[:top_k]]
+
+def is_keyword_query(text):
+    words = text.split()
+    return (
+        0 < len(words) <= KEYWORD_MAX_WORDS
+        and "?" not in text
+        and words[0].lower() not in QUESTION_WORDS
     )
 
+def format_matches(user_query, hits):
+    lines = [f'Notes matching "{user_query}":']
+    for _, doc, meta in hits:
+        snippet = " ".join(doc.split())
+        if len(snippet) > 300:
+            snippet = snippet[:300] + "..."
+        lines.append(f"\n{meta['filename']}:{meta['part']}\n{snippet}")
+    return "\n".join(lines)
+
+def search(search_text, vault_label, top_k=5, mode=None):
+    return "".join(search_stream(search_text, vault_label, top_k, mode))
+
+def search_stream(search_text, vault_label, top_k=5, mode=None):
+    """Like search(), but yields the answer in pieces as gpt-4o generates it."""
+    mode = mode or SEARCH_MODE
+
+    # Check if the vault exists
+    if not is_vault(vault_label):
+        yield f'"{vault_label}" is not a vault.'
+        return
+
+    user_query = search_text.strip()
+    lexical_hits = lexical.search(user_query, vault_label, top_k) if mode in ("lexical", "hybrid") else []
+
+    if KEYWORD_FAST_PATH and lexical_hits and is_keyword_query(user_query):
+        yield format_matches(user_query, lexical_hits)
+        return
+
+    if mode == "lexical":
+        hits = lexical_hits
+    elif len(user_query.split()) < REWRITE_MIN_WORDS:
+        hits = fuse([retrieve(user_query, vault_label, top_k), lexical_hits], top_k)
+    elif PARALLEL_REWRITE:
+        raw = pool.submit(retrieve, user_query, vault_label, top_k)
+        rewritten = pool.submit(lambda: retrieve(rewrite(user_query), vault_label, top_k))
+        rankings = [raw.result(), lexical_hits]
+        try:
+            rankings.append(rewritten.result(timeout=REWRITE_TIMEOUT))
+        except TimeoutError:
+            print("Query rewrite timed out; answering from the raw query.")
+        except Exception as e:
+            # The raw-query results are already in hand; a failed rewrite only loses recall.
+            print(f"Query rewrite failed ({type(e).__name__}: {e}); answering from the raw query.")
+        hits = fuse(rankings, top_k)
+    else:
+        hits = fuse([retrieve(rewrite(user_query), vault_label, top_k), lexical_hits], top_k)
+
+    # The raw query was embedded during retrieval, so this is served from the embedding cache.
+    query_embedding = embed(user_query) if mode != "lexical" else None
+    cached = answers.get(vault_label, user_query, hits, query_embedding)
+    if cached is not None:
+        yield cached
+        return
+
     # --- COMPILE CHUNKS ---
     chunks = [
         f"Filename: {meta['filename']} (part {meta['part']})\n---\n{doc.strip()}"
-        for doc, meta in zip(results["documents"][0], results["metadatas"][0])
+        for _, doc, meta in hits
     ]
 
     # --- ANSWER GENERATION ---
@@ -64,12 +182,17 @@ def search(search_text, vault_label, top_k=5):
         + f"\n\nUser Query: {user_query}"
     )
 
-    response = client.responses.create(
+    stream = client.responses.create(
         model="gpt-4o",
-        input=answer_prompt
+        input=answer_prompt,
+        stream=True
     )
 
-    return response.output_text
+    answer = ""
+    for delta in text_deltas(stream):
+        answer += delta
+        yield delta
+    answers.put(vault_label, user_query, hits, answer, query_embedding)
 
 
 if __name__ == "__main__":
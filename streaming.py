@@ -0,0 +1,75 @@
+import time
+
+from telebot import apihelper, asyncio_helper
+
+# Telegram allows roughly one edit per second per chat before it starts returning 429s.
+EDIT_INTERVAL = 1.0
+MESSAGE_LIMIT = 4096
+# The sync and async Telegram clients raise distinct exception classes.
+TELEGRAM_ERRORS = (apihelper.ApiTelegramException, asyncio_helper.ApiTelegramException)
+
+
+def text_deltas(events):
+    """Yield the text pieces of a streamed client.responses.create(stream=True) call."""
+    for event in events:
+        if event.type == "response.output_text.delta":
+            yield event.delta
+
+
+class _StreamedMessage:
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = None
+        self.shown = ""
+        self.last_edit = 0.0
+
+    def show(self, text, force=False):
+        text = text.strip()
+        if not text or text == self.shown:
+            return
+        if not force and time.monotonic() - self.last_edit < EDIT_INTERVAL:
+            return
+        while True:
+            try:
+                if self.message_id is None:
+                    self.message_id = self.bot.send_message(self.chat_id, text).message_id
+                else:
+                    self.bot.edit_message_text(text, self.chat_id, self.message_id)
+                self.shown = text
+                break
+            except TELEGRAM_ERRORS as e:
+                if e.error_code != 429:
+                    raise
+                # Rate limited: drop intermediate updates (the next one carries the accumulated
+                # text), but wait and retry the final one.
+                if not force:
+                    break
+                time.sleep(e.result_json.get("parameters", {}).get("retry_after", 1))
+        self.last_edit = time.monotonic()
+
+
+def send_streamed(bot, chat_id, deltas, empty="No response."):
+    """Deliver incrementally generated text as a message that is edited in place as it grows.
+
+    Edits are coalesced to one per EDIT_INTERVAL; text past Telegram's length limit
+    continues in a new message. Returns the full text.
+    """
+    full = ""
+    pending = ""
+    message = _StreamedMessage(bot, chat_id)
+    for delta in deltas:
+        full += delta
+        pending += delta
+        # A single delta (a cached answer, say) can hold several messages' worth of text.
+        while len(pending) > MESSAGE_LIMIT:
+            cut = pending.rfind("\n", 0, MESSAGE_LIMIT)
+            cut = cut if cut > 0 else MESSAGE_LIMIT
+            message.show(pending[:cut], force=True)
+            pending = pending[cut:]
+            message = _StreamedMessage(bot, chat_id)
+        message.show(pending)
+    message.show(pending, force=True)
+    if not full.strip():
+        bot.send_message(chat_id, empty)
+    return full
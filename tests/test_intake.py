@@ -0,0 +1,73 @@
+import hashlib
+import importlib
+import io
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("openai")
+
+NOTES = {
+    "a.md": "# A\n\nhello world\n\nmore text here",
+    "sub/b.md": "line one\r\nline two\r\n",
+    "empty.md": "",
+    ".obsidian/skip.md": "not indexed",
+}
+
+
+@pytest.fixture(scope="module")
+def intake_obsidian(tmp_path_factory):
+    """The intake module, imported in a scratch directory with the numpy store and fake embeddings."""
+    workdir = tmp_path_factory.mktemp("intake")
+    (workdir / "config.toml").write_text('[openai]\napi = "test"\n\n[vector_store]\nbackend = "numpy"\n')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        module = importlib.import_module("intake_obsidian")
+
+        def embed_batch(texts, tokens=0):
+            return [list(hashlib.md5(t.encode("utf-8")).digest()[:8]) for t in texts]
+
+        module.embed_batch = embed_batch
+        yield module
+    finally:
+        os.chdir(cwd)
+
+
+def write_vault(root):
+    for name, content in NOTES.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content.encode("utf-8"))
+
+
+def test_intake_directory(intake_obsidian, tmp_path):
+    write_vault(tmp_path)
+    assert intake_obsidian.intake(tmp_path, "dir").startswith("Indexed")
+    assert set(intake_obsidian.file_hashes("dir")) == {"a.md", "sub/b.md", "empty.md"}
+    assert intake_obsidian.intake(tmp_path, "dir") == "No files to update."
+
+
+def test_intake_zip_matches_directory(intake_obsidian, tmp_path):
+    write_vault(tmp_path / "vault")
+    intake_obsidian.intake(tmp_path / "vault", "from-dir")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name, content in NOTES.items():
+            zf.writestr(name, content)
+    archive.seek(0)
+    assert intake_obsidian.intake_zip(archive, "from-zip").startswith("Indexed")
+    assert intake_obsidian.file_hashes("from-zip") == intake_obsidian.file_hashes("from-dir")
+    archive.seek(0)
+    assert intake_obsidian.intake_zip(archive, "from-zip") == "No files to update."
+
+
+def test_vault_indexed_elsewhere_is_found(intake_obsidian, tmp_path):
+    search_obsidian = importlib.import_module("search_obsidian")
+    write_vault(tmp_path)
+    intake_obsidian.intake(tmp_path, "elsewhere")
+    # As seen by a process that loaded the vault set before the other process's intake.
+    search_obsidian._known_vaults = set()
+    assert search_obsidian.is_vault("elsewhere")
+    assert not search_obsidian.is_vault("missing")
@@ -0,0 +1,69 @@
+import pytest
+
+from intents import parse_intent
+
+ACCEPTED = [
+    ("add buy milk tomorrow", ("create", {"content": "buy milk", "due": "tomorrow"})),
+    ("Add a task to call the dentist on friday at 3pm", ("create", {"content": "call the dentist", "due": "on friday at 3pm"})),
+    ("add a reminder for buying stamps", ("create", {"content": "buying stamps", "due": None})),
+    ("remind me to water plants every day", ("create", {"content": "water plants", "due": "every day"})),
+    ("create task: file taxes 2025-04-15", ("create", {"content": "file taxes", "due": "2025-04-15"})),
+    ("add review PR", ("create", {"content": "review PR", "due": None})),
+    ("add a new task to book flights", ("create", {"content": "book flights", "due": None})),
+    ("done buy milk", ("close", {"content": "buy milk"})),
+    ("mark buy milk as done", ("close", {"content": "buy milk"})),
+    ("complete the dentist task", ("close", {"content": "dentist"})),
+    ("What's due today?", ("list", {"filter": "today", "label": "today"})),
+    ("what is due tomorrow", ("list", {"filter": "tomorrow", "label": "tomorrow"})),
+    ("what are my tasks due this week?", ("list", {"filter": "7 days", "label": "in the next 7 days"})),
+    ("show my tasks for today", ("list", {"filter": "today", "label": "today"})),
+    ("list tasks due tomorrow", ("list", {"filter": "tomorrow", "label": "tomorrow"})),
+    ("show overdue tasks", ("list", {"filter": "overdue", "label": "overdue"})),
+    ("what's overdue?", ("list", {"filter": "overdue", "label": "overdue"})),
+]
+
+REJECTED = [
+    # Not due-date listings.
+    "What did I complete today?",
+    "Show tasks that aren't due today",
+    "what should I prioritise today?",
+    "show me tasks I deleted today",
+    "what am I doing today?",
+    "What tasks are in project Home today?",
+    # Filler or a bare due phrase instead of task text.
+    "add a reminder for tomorrow",
+    "add a task",
+    "add it",
+    # Destinations the model has to resolve, in any case.
+    "add milk to my shopping list",
+    "add eggs to shopping",
+    "add buy milk to Household",
+    "add report in Work",
+    "add #work report",
+    "Add milk p1",
+    "add milk to Project Home",
+    # Ordinary sentences that open with a command word.
+    "New year resolutions are hard",
+    "Add up my tasks for today",
+    "create a summary of what I did today",
+    # Close commands covering more than one task.
+    "mark all tasks as done",
+    "complete all my tasks for today",
+    "finish everything",
+    # Too vague or not a command.
+    "buy milk done",
+    "all done",
+    "close it",
+    "hello",
+    "what is the capital of France",
+]
+
+
+@pytest.mark.parametrize("text, expected", ACCEPTED)
+def test_accepted(text, expected):
+    assert parse_intent(text) == expected
+
+
+@pytest.mark.parametrize("text", REJECTED)
+def test_rejected(text):
+    assert parse_intent(text) is None
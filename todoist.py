@@ -1,6 +1,8 @@
+import requests
 import toml
-from todoist_api_python.api import TodoistAPI
 from openai import OpenAI
+from streaming import text_deltas
+from todoist_mirror import TodoistMirror
 
 CONFIG = toml.load("config.toml")
 TODOIST_API_KEY = CONFIG["todoist"]["api"]
@@ -8,33 +10,35 @@ OPENAI_API_KEY = CONFIG["openai"]["api"]
 USER_NAME = CONFIG["user"]["name"]
 
 
-api = TodoistAPI(TODOIST_API_KEY)
+mirror = TodoistMirror(TODOIST_API_KEY, max_age=CONFIG.get("todoist", {}).get("sync_interval", 5.0))
 
 from datetime import datetime
 
 def generate_task_list(query=None, properties=None):
-    tasks = [t for page in api.get_tasks() for t in page]
-    tasks.sort(key=lambda t: (t.due is not None, str(t.due.date) if t.due else ""))
+    try:
+        mirror.sync()
+    except requests.exceptions.RequestException as e:
+        # Answer from the last synced state rather than failing the question.
+        print(f"Todoist sync failed, using cached tasks: {e}")
+    projects = {p["id"]: p["name"] for p in mirror.projects()}
+    tasks = mirror.tasks()
 
-    project_lookup = {str(p.id): p.name for page in api.get_projects() for p in page}
-    tasks = [t for page in api.get_tasks() for t in page]
-
-    tasks.sort(key=lambda t: (t.due is not None, str(t.due.date) if t.due else ""))
+    tasks.sort(key=lambda t: (t.get("due") is not None, t["due"]["date"] if t.get("due") else ""))
 
     out = ""
     for t in tasks:
-        due = t.due.date if t.due else None
+        due = t["due"]["date"] if t.get("due") else None
         if due:
             try:
                 due = datetime.fromisoformat(str(due)).strftime("%Y-%m-%d (%A)")
             except:
                 pass
 
-        line = f"content: {t.content}"
+        line = f"content: {t['content']}"
         if due:
             line += f", due_date: {due}"
-        if t.project_id and str(t.project_id) in project_lookup:
-            line += f", project: {project_lookup[str(t.project_id)]}"
+        if t.get("project_id") in projects:
+            line += f", project: {projects[t['project_id']]}"
 
         out += line + "\n"
 
@@ -45,18 +49,23 @@ def generate_task_list(query=None, properties=None):
 
 
 def search(query, limit=5):
+    answer = "".join(search_stream(query, limit))
+    print(answer)
+    return answer
+
+def search_stream(query, limit=5):
+    """Like search(), but yields the answer in pieces as it is generated."""
     TL = generate_task_list(query=query)
     client = OpenAI(api_key=OPENAI_API_KEY)
 
     today = datetime.now().strftime("%Y-%m-%d (%A)")
-    response = client.responses.create(
+    stream = client.responses.create(
         model="gpt-4o-mini",
         instructions=f"Answer the user's question based on the provided task list. The current user is {USER_NAME}, and the date is {today}.",
         input=f"{query}\n\nHere is the task list:\n{TL}",
+        stream=True,
     )
-
-    print(response.output_text)
-    return response.output_text
+    yield from text_deltas(stream)
 
 if __name__ == "__main__":
     searches =["What am I doing thursday?", "What do I have on Laurens list?", "What tasks are due today?"]
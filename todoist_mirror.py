@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+SYNC_URL = "https://api.todoist.com/api/v1/sync"
+MIRROR_PATH = "./cache/todoist.sqlite3"
+RESOURCE_TYPES = ("items", "projects")
+
+
+class TodoistMirror:
+    """Local copy of the account's active tasks and projects, kept current with the Sync API.
+
+    The first sync downloads everything; later ones send the stored sync_token and apply
+    only what changed. State is persisted in SQLite so a restart resumes incrementally.
+    Syncs are skipped when the last one is younger than `max_age` seconds.
+    """
+
+    def __init__(self, token, path=MIRROR_PATH, max_age=5.0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS resources (
+                type TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (type, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self.conn.commit()
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.max_age = max_age
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def _sync_token(self):
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'sync_token'").fetchone()
+        return row[0] if row else "*"
+
+    def sync(self, force=False):
+        """Pull changes since the last sync. Returns the number of changed resources."""
+        with self.lock:
+            if not force and time.monotonic() - self.synced_at < self.max_age:
+                return 0
+            r = self.session.post(SYNC_URL, data={
+                "sync_token": self._sync_token(),
+                "resource_types": json.dumps(list(RESOURCE_TYPES)),
+            }, timeout=(5, 60))
+            r.raise_for_status()
+            data = r.json()
+            changed = 0
+            with self.conn:
+                if data.get("full_sync"):
+                    self.conn.execute("DELETE FROM resources")
+                for kind in RESOURCE_TYPES:
+                    for obj in data.get(kind, []):
+                        changed += 1
+                        if obj.get("is_deleted") or obj.get("checked") or obj.get("is_archived"):
+                            self.conn.execute("DELETE FROM resources WHERE type = ? AND id = ?", (kind, str(obj["id"])))
+                        else:
+                            self.conn.execute(
+                                "INSERT OR REPLACE INTO resources (type, id, data) VALUES (?, ?, ?)",
+                                (kind, str(obj["id"]), json.dumps(obj))
+                            )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO state (key, value) VALUES ('sync_token', ?)", (data["sync_token"],)
+                )
+            self.synced_at = time.monotonic()
+            return changed
+
+    def _all(self, kind):
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM resources WHERE type = ?", (kind,)).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def tasks(self):
+        return self._all("items")
+
+    def projects(self):
+        return self._all("projects")
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+
+import toml
+
+from history import enc
+
+CONFIG = toml.load("config.toml")
+# Tokenizing the raw payload to print the saving costs as much as the saving is worth on
+# large lists, so it is only done when asked for.
+REPORT_TOKENS = CONFIG.get("openrouter", {}).get("tool_result_stats", False)
+# Rows returned per list call; the rest is reachable through the cursor parameter.
+PAGE_SIZE = 50
+
+# Fields the model needs from each Todoist resource, in column order.
+FIELDS = {
+    "tasks": ("id", "content", "due", "priority", "labels", "project_id", "section_id", "parent_id"),
+    "projects": ("id", "name", "parent_id", "is_favorite"),
+    "sections": ("id", "name", "project_id"),
+    "labels": ("id", "name", "is_favorite"),
+}
+# Single-item lookups also carry the long free-text fields left out of list rows.
+ITEM_FIELDS = {**FIELDS, "tasks": FIELDS["tasks"] + ("description",)}
+# Field values that carry no information and are left out.
+DEFAULTS = (None, "", [], False)
+
+
+def _value(field, value):
+    if field == "due" and isinstance(value, dict):
+        when = value.get("datetime") or value.get("date")
+        return f"{when} ({value.get('string')})" if value.get("is_recurring") else when
+    if field == "priority" and value == 1:
+        return None
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return value
+
+
+def project(kind, item, fields=FIELDS):
+    """Keep only the listed fields of a resource, with non-default values flattened to scalars."""
+    out = {}
+    for field in fields[kind]:
+        value = _value(field, item.get(field))
+        if value not in DEFAULTS:
+            out[field] = value
+    return out
+
+
+def _report(kind, raw, compact):
+    if not REPORT_TOKENS:
+        return
+    before = len(enc.encode(json.dumps(raw), disallowed_special=()))
+    after = len(enc.encode(compact, disallowed_special=()))
+    print(f"Tool result {kind}: {before} -> {after} tokens")
+
+
+def encode_list(kind, items, cursor=0, page_size=PAGE_SIZE):
+    """Render a page of resources as CSV under a one-line header.
+
+    Columns that are empty on every row of the page are dropped. When more rows remain,
+    the header says which cursor to pass to fetch the next page.
+    """
+    cursor = max(int(cursor or 0), 0)
+    page = [project(kind, item) for item in items[cursor:cursor + page_size]]
+    if not page:
+        return f"No {kind} found."
+    columns = [f for f in FIELDS[kind] if any(f in row for row in page)]
+    end = cursor + len(page)
+    header = f"{kind} {cursor + 1}-{end} of {len(items)}"
+    if end < len(items):
+        header += f"; more available, call again with cursor={end}"
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, columns, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(page)
+    compact = f"{header}\n{buf.getvalue()}"
+    _report(kind, items, compact)
+    return compact
+
+
+def encode_item(kind, item):
+    """Render a single resource as `field: value` lines."""
+    compact = "\n".join(f"{k}: {v}" for k, v in project(kind, item, ITEM_FIELDS).items())
+    _report(kind, item, compact)
+    return compact
@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import toml
+
+CONFIG = toml.load("config.toml")
+STORE_CONFIG = CONFIG.get("vector_store", {})
+# "chroma" (default) or "numpy". Switching backends starts from an empty store; the next
+# intake re-indexes every vault, with embeddings served from the embedding cache.
+BACKEND = STORE_CONFIG.get("backend", "chroma")
+CHROMA_PATH = "./chroma_db"
+NUMPY_PATH = "./cache/vectors"
+# Rows scored per matrix product, bounding the float32 working set for float16 segments.
+SCORE_BLOCK = 65536
+
+
+class ChromaStore:
+    """The vault_index collection in a persistent Chroma database."""
+
+    def __init__(self, path=CHROMA_PATH, name="vault_index"):
+        import chromadb
+        self.collection = chromadb.PersistentClient(path=path).get_or_create_collection(name=name)
+
+    @staticmethod
+    def _where(vault=None, part=None, filenames=None):
+        clauses = []
+        if part is not None:
+            clauses.append({"part": part})
+        if vault is not None:
+            clauses.append({"vault": vault})
+        if filenames is not None:
+            clauses.append({"filename": {"$in": list(filenames)}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def find(self, vault=None, part=None, filenames=None, documents=False, limit=None, offset=None):
+        """Return (id, document, metadata) rows matching the filters; document is None unless requested."""
+        result = self.collection.get(
+            where=self._where(vault, part, filenames),
+            include=["metadatas", "documents"] if documents else ["metadatas"],
+            limit=limit,
+            offset=offset
+        )
+        docs = result["documents"] if documents else [None] * len(result["ids"])
+        return list(zip(result["ids"], docs, result["metadatas"]))
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=list(ids))
+
+    def query(self, embedding, vault, top_k):
+        """Return the top_k (id, document, metadata) rows nearest to embedding within a vault."""
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=top_k,
+            include=["documents", "metadatas"],
+            where={"vault": vault}
+        )
+        return list(zip(results["ids"][0], results["documents"][0], results["metadatas"][0]))
+
+
+class _Segment:
+    def __init__(self, number, path, vectors):
+        self.number = number
+        self.path = path
+        self.vectors = vectors
+        self.live = np.zeros(len(vectors), dtype=bool)
+        self.vault = np.full(len(vectors), -1, dtype=np.int32)
+        self.ids = [None] * len(vectors)
+
+
+class NumpyStore:
+    """Exact nearest-neighbour search over memory-mapped embedding matrices.
+
+    Each upsert appends one immutable .npy segment of unit-normalised vectors; rows, their
+    metadata and which segment slot holds each id's current vector live in SQLite. A
+    replaced or deleted row leaves a dead slot (tombstone) behind, and once dead slots
+    exceed `compact_ratio` of the total, or there are more than `max_segments` segments,
+    the live vectors are rewritten into a single segment. Queries score every live slot of
+    the vault with one matrix-vector product per segment.
+    """
+
+    def __init__(self, path=NUMPY_PATH, dtype="float32", compact_ratio=0.3, max_segments=16):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.compact_ratio = compact_ratio
+        self.max_segments = max_segments
+        self.conn = sqlite3.connect(os.path.join(path, "rows.sqlite3"), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS segments (number INTEGER PRIMARY KEY, size INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS rows (
+                id TEXT PRIMARY KEY, segment INTEGER NOT NULL, slot INTEGER NOT NULL,
+                vault TEXT NOT NULL, filename TEXT NOT NULL, part INTEGER NOT NULL,
+                document TEXT NOT NULL, metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS rows_vault ON rows (vault, filename);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.segments = {}
+        self.vaults = {}
+
+    def _segment_path(self, number):
+        return os.path.join(self.path, f"segment-{number:06d}.npy")
+
+    def _stored_generation(self):
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _bump_generation(self):
+        self.conn.execute(
+            "INSERT INTO state (key, value) VALUES ('generation', 1) "
+            "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+        )
+
+    def _vault_code(self, vault):
+        return self.vaults.setdefault(vault, len(self.vaults))
+
+    def _load(self):
+        """(Re)build the in-memory slot maps if another writer, or this one, changed the store."""
+        generation = self._stored_generation()
+        if generation == self.generation:
+            return
+        self.segments = {}
+        for number, size in self.conn.execute("SELECT number, size FROM segments"):
+            path = self._segment_path(number)
+            self.segments[number] = _Segment(number, path, np.load(path, mmap_mode="r"))
+        for i, number, slot, vault in self.conn.execute("SELECT id, segment, slot, vault FROM rows"):
+            segment = self.segments[number]
+            segment.live[slot] = True
+            segment.vault[slot] = self._vault_code(vault)
+            segment.ids[slot] = i
+        self.generation = generation
+
+    def _write_segment(self, vectors):
+        number = (self.conn.execute("SELECT MAX(number) FROM segments").fetchone()[0] or 0) + 1
+        path = self._segment_path(number)
+        # Write under a temporary name so a crash never leaves a truncated segment in place.
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, vectors.astype(self.dtype))
+        os.replace(path + ".tmp", path)
+        self.conn.execute("INSERT INTO segments (number, size) VALUES (?, ?)", (number, len(vectors)))
+        return number
+
+    @staticmethod
+    def _normalise(embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        if not ids:
+            return
+        with self.lock:
+            with self.conn:
+                number = self._write_segment(self._normalise(embeddings))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO rows (id, segment, slot, vault, filename, part, document, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(i, number, slot, m["vault"], m["filename"], m["part"], d, json.dumps(m))
+                     for slot, (i, d, m) in enumerate(zip(ids, documents, metadatas))]
+                )
+                self._bump_generation()
+            self._maybe_compact()
+
+    def delete(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("DELETE FROM rows WHERE id = ?", [(i,) for i in ids])
+                self._bump_generation()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        total, live, segments = self.conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM segments), (SELECT COUNT(*) FROM rows), "
+            "(SELECT COUNT(*) FROM segments)"
+        ).fetchone()
+        if total and ((total - live) / total > self.compact_ratio or segments > self.max_segments):
+            self._compact()
+
+    def compact(self):
+        """Rewrite all live vectors into one segment and drop the old segment files."""
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        self._load()
+        live = [(segment, np.flatnonzero(segment.live)) for segment in self.segments.values()]
+        ids = [segment.ids[slot] for segment, slots in live for slot in slots]
+        old = list(self.segments)
+        with self.conn:
+            if ids:
+                vectors = np.concatenate([np.asarray(segment.vectors[slots]) for segment, slots in live])
+                number = self._write_segment(vectors)
+                self.conn.executemany(
+                    "UPDATE rows SET segment = ?, slot = ? WHERE id = ?",
+                    [(number, slot, i) for slot, i in enumerate(ids)]
+                )
+            self.conn.executemany("DELETE FROM segments WHERE number = ?", [(n,) for n in old])
+            self._bump_generation()
+        self.segments = {}
+        self.generation = None
+        referenced = {self._segment_path(n) for n, in self.conn.execute("SELECT number FROM segments")}
+        for path in glob.glob(os.path.join(self.path, "segment-*.npy*")):
+            if path not in referenced:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Could not remove old segment {path}: {e}")
+
+    def find(self, vault=None, part=None, filenames=None, documents=False, limit=None, offset=None):
+        """Return (id, document, metadata) rows matching the filters; document is None unless requested."""
+        clauses, params = [], []
+        if vault is not None:
+            clauses.append("vault = ?")
+            params.append(vault)
+        if part is not None:
+            clauses.append("part = ?")
+            params.append(part)
+        if filenames is not None:
+            filenames = list(filenames)
+            clauses.append(f"filename IN ({', '.join('?' * len(filenames))})")
+            params.extend(filenames)
+        sql = f"SELECT id, {'document' if documents else 'NULL'}, metadata FROM rows"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset or 0])
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [(i, d, json.loads(m)) for i, d, m in rows]
+
+    def query(self, embedding, vault, top_k):
+        """Return the top_k (id, document, metadata) rows nearest to embedding within a vault."""
+        q = self._normalise([embedding])[0]
+        with self.lock:
+            self._load()
+            code = self.vaults.get(vault)
+            if code is None:
+                return []
+            best_ids, best_scores = [], []
+            for segment in self.segments.values():
+                mask = segment.live & (segment.vault == code)
+                if not mask.any():
+                    continue
+                scores = np.concatenate([
+                    np.asarray(segment.vectors[i:i + SCORE_BLOCK], dtype=np.float32) @ q
+                    for i in range(0, len(segment.vectors), SCORE_BLOCK)
+                ])
+                scores[~mask] = -np.inf
+                k = min(top_k, int(mask.sum()))
+                top = np.argpartition(-scores, k - 1)[:k]
+                best_ids.extend(segment.ids[slot] for slot in top)
+                best_scores.extend(scores[top])
+            order = np.argsort(-np.asarray(best_scores))[:top_k]
+            ids = [best_ids[i] for i in order]
+            rows = {
+                i: (d, m) for i, d, m in self.conn.execute(
+                    f"SELECT id, document, metadata FROM rows WHERE id IN ({', '.join('?' * len(ids))})", ids
+                )
+            } if ids else {}
+        return [(i, rows[i][0], json.loads(rows[i][1])) for i in ids if i in rows]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """The configured store, shared by intake and search within a process."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            if BACKEND == "numpy":
+                _default = NumpyStore(
+                    STORE_CONFIG.get("path", NUMPY_PATH),
+                    dtype=STORE_CONFIG.get("dtype", "float32"),
+                    compact_ratio=STORE_CONFIG.get("compact_ratio", 0.3),
+                    max_segments=STORE_CONFIG.get("max_segments", 16),
+                )
+            elif BACKEND == "chroma":
+                _default = ChromaStore(STORE_CONFIG.get("path", CHROMA_PATH))
+            else:
+                raise ValueError(f"Unknown vector_store backend: {BACKEND!r}")
+        return _default
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from telebot import types
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateDeduper:
+    """Remembers the most recent update_ids so updates Telegram redelivers are processed once."""
+
+    def __init__(self, size=10000):
+        self.size = size
+        self.seen_ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def seen(self, update_id):
+        with self.lock:
+            if update_id in self.seen_ids:
+                return True
+            self.seen_ids[update_id] = None
+            if len(self.seen_ids) > self.size:
+                self.seen_ids.popitem(last=False)
+            return False
+
+
+def create_app(process_updates, secret_token=None, path="/telegram"):
+    """ASGI app that accepts Telegram webhook POSTs and hands each new update to process_updates.
+
+    process_updates is a bot's process_new_updates: a TeleBot's runs on the threadpool, an
+    AsyncTeleBot's is scheduled as a task. Either way Telegram gets its 200 straight away.
+    Updates are handed over one at a time, in arrival order, so per-chat ordering holds
+    as it does with polling.
+    """
+    dedupe = UpdateDeduper()
+    is_async = asyncio.iscoroutinefunction(process_updates)
+    tasks = set()
+    handoff = asyncio.Lock()
+
+    async def receive(request):
+        if secret_token and request.headers.get(SECRET_HEADER) != secret_token:
+            return Response(status_code=403)
+        update = types.Update.de_json(await request.json())
+        if update is None or dedupe.seen(update.update_id):
+            return Response()
+        if is_async:
+            task = asyncio.create_task(process_updates([update]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        else:
+            # process_new_updates only enqueues on the dispatcher, so holding the lock is brief.
+            async with handoff:
+                await run_in_threadpool(process_updates, [update])
+        return Response()
+
+    async def health(request):
+        return PlainTextResponse("ok")
+
+    return Starlette(routes=[
+        Route(path, receive, methods=["POST"]),
+        Route("/healthz", health, methods=["GET"]),
+    ])
+
+
+def serve(bot, url, host="0.0.0.0", port=8080, secret_token=None, path="/telegram"):
+    """Register the webhook with Telegram and serve updates for a TeleBot until interrupted.
+
+    max_connections=1 makes Telegram deliver updates sequentially, like polling does.
+    """
+    bot.remove_webhook()
+    bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret_token, max_connections=1)
+    uvicorn.run(create_app(bot.process_new_updates, secret_token, path), host=host, port=port)
+
+
+async def serve_async(bot, url, host="0.0.0.0", port=8080, secret_token=None, path="/telegram"):
+    """Async counterpart of serve() for an AsyncTeleBot, sharing the caller's event loop."""
+    await bot.remove_webhook()
+    await bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret_token, max_connections=1)
+    app = create_app(bot.process_new_updates, secret_token, path)
+    await uvicorn.Server(uvicorn.Config(app, host=host, port=port)).serve()